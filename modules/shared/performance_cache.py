@@ -33,9 +33,14 @@ class UnifiedPerformanceCache:
         self.executor = ThreadPoolExecutor(max_workers=6)
         
     def _generate_cache_key(self, prefix: str, *args, **kwargs) -> str:
-        """Generate consistent cache key"""
+        """Generate consistent cache key
+
+        The prefix is kept in clear text in front of the argument digest
+        so invalidate_pattern can target entries by operation instead of
+        clearing the whole cache.
+        """
         key_data = f"{prefix}_{str(args)}_{str(sorted(kwargs.items()))}"
-        return hashlib.md5(key_data.encode()).hexdigest()
+        return f"{prefix}:{hashlib.md5(key_data.encode()).hexdigest()}"
     
     def get_cached_data(self, key: str, cache_type: str = 'file_list') -> Optional[Any]:
         """Get cached data if valid"""
@@ -152,12 +152,16 @@ def get_bbva_accounts() -> Dict[str, Dict[str, Any]]:
     """Get all BBVA accounts"""
     return get_accounts_by_type('bbva')
 
+# Identifier -> (account_id, config) index, built once at import time;
+# upload auto-detection resolves accounts by identifier on every file
+_ACCOUNTS_BY_IDENTIFIER = {
+    account_config['identifier']: (account_id, account_config)
+    for account_id, account_config in UNIFIED_ACCOUNTS.items()
+}
+
 def get_account_by_identifier(identifier: str) -> tuple[str, Dict[str, Any]]:
     """Get account by its identifier (account number or CLABE)"""
-    for account_id, account_config in UNIFIED_ACCOUNTS.items():
-        if account_config['identifier'] == identifier:
-            return account_id, account_config
-    return None, {}
+    return _ACCOUNTS_BY_IDENTIFIER.get(identifier, (None, {}))
 
 def validate_unified_config() -> Dict[str, bool]:
     """Validate the unified configuration"""
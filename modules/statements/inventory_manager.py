@@ -6,21 +6,39 @@ Handles reading, writing, and updating the central inventory file
 
 import json
 import logging
+import os
+import threading
 from datetime import datetime
 from typing import Dict, Any, Optional, List
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, is_dataclass
+
+# orjson encodes nested dicts of primitives (and dataclasses) several
+# times faster than stdlib json; fall back to the streaming encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class FileInfo:
-    """Data structure for individual file information"""
+    """Data structure for individual file information
+
+    Slotted to keep the per-file footprint small - a full scan holds one
+    of these per file across every account. Inventories read back from
+    SharePoint contain plain dicts, so get() mirrors the dict API and
+    lets consumers treat both shapes the same.
+    """
     exists: bool
     last_modified: Optional[str] = None
     parse_status: str = "not_parsed"  # not_parsed, parsed, error
     transaction_count: int = 0
     file_size: Optional[int] = None
 
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
 @dataclass
 class MonthInfo:
     """Data structure for month information"""
@@ -28,13 +46,30 @@ class MonthInfo:
     xlsx: Optional[FileInfo] = None
 
 class InventoryManager:
-    """Manages the central statements inventory file"""
-    
+    """Manages the central statements inventory file
+
+    The inventory is mirrored to a local cache file so single-account
+    rescans do not pay the SharePoint read-modify-write round-trip on
+    the hot path. Updates mark the cache dirty and a debounced timer
+    (or an explicit flush) uploads the merged state to SharePoint,
+    which remains the source of truth.
+    """
+
+    # Local mirror of the SharePoint inventory file
+    LOCAL_CACHE_DIR = ".cache"
+    # Seconds to wait after the last update before syncing to SharePoint
+    FLUSH_DELAY_SECONDS = 30
+
     def __init__(self, inventory_file_path: str = "statements_inventory.json"):
         self.inventory_file_path = inventory_file_path
         self.logger = logging.getLogger(__name__ + '.InventoryManager')
         self._cached_inventory = None
         self._cache_timestamp = None
+        self._local_cache_path = os.path.join(self.LOCAL_CACHE_DIR, inventory_file_path)
+        self._dirty = False
+        self._flush_timer = None
+        self._flush_lock = threading.Lock()
+        self._pending_token = None
     
     def read_inventory(self, access_token: str, force_refresh: bool = False) -> Dict[str, Any]:
         """
@@ -52,7 +87,15 @@ class InventoryManager:
             if not force_refresh and self._cached_inventory is not None:
                 self.logger.debug("Returning cached inventory")
                 return self._cached_inventory
-            
+
+            # Fall back to the local disk mirror before going to SharePoint
+            if not force_refresh:
+                local_inventory = self._read_local_cache()
+                if local_inventory is not None:
+                    self._cached_inventory = local_inventory
+                    self._cache_timestamp = datetime.now()
+                    return local_inventory
+
             # Read from SharePoint using existing STP file functions
             from modules.stp.stp_files import get_file_content_by_ids
             
@@ -107,20 +150,28 @@ class InventoryManager:
             # Update last_updated timestamp
             inventory['last_updated'] = datetime.now().isoformat()
             inventory['version'] = inventory.get('version', '1.0')
-            
-            # Convert to JSON bytes
-            content = json.dumps(inventory, indent=2, ensure_ascii=False)
-            content_bytes = content.encode('utf-8')
-            
+
             self.logger.info(f"Writing inventory file with {len(inventory.get('accounts', {}))} accounts")
-            
-            # Create Inventario folder path if it doesn't exist and upload
-            success = self._upload_to_inventario_folder(content_bytes, access_token)
+
+            # Create Inventario folder path if it doesn't exist and upload.
+            # Prefer orjson's C encoder (bytes out, dataclasses handled
+            # natively); otherwise stream the stdlib encoding chunk-wise
+            if orjson is not None:
+                payload = orjson.dumps(inventory, option=orjson.OPT_INDENT_2)
+            else:
+                payload = self._iter_inventory_json(inventory)
+            success = self._upload_to_inventario_folder(payload, access_token)
             
             if success:
-                # Update cache
+                # Update caches and clear any pending lazy sync
                 self._cached_inventory = inventory
                 self._cache_timestamp = datetime.now()
+                self._write_local_cache(inventory)
+                with self._flush_lock:
+                    self._dirty = False
+                    if self._flush_timer is not None:
+                        self._flush_timer.cancel()
+                        self._flush_timer = None
                 self.logger.info("Successfully wrote inventory file")
                 return True
             else:
@@ -176,25 +227,38 @@ class InventoryManager:
                                access_token: str) -> bool:
         """
         Update entire account inventory with new data
-        
+
+        Writes to the local cache immediately and marks it dirty; the
+        SharePoint upload happens on a debounced timer (or an explicit
+        flush), so repeated single-account updates skip the upload
+        round-trip on the hot path.
+
         Args:
             account_id: Account identifier
             account_data: Complete account data structure
             access_token: OAuth access token
-            
+
         Returns:
             bool: True if successful
         """
         try:
-            inventory = self.read_inventory(access_token, force_refresh=True)
-            
+            # Re-read from SharePoint only when we have no cached copy
+            # to merge into; otherwise the local mirror is authoritative
+            force = self._cached_inventory is None and not os.path.exists(self._local_cache_path)
+            inventory = self.read_inventory(access_token, force_refresh=force)
+
             # Update account section
             inventory['accounts'][account_id] = account_data
-            
+            inventory['last_updated'] = datetime.now().isoformat()
+
             self.logger.info(f"Updated complete inventory for account: {account_id}")
-            
-            return self.write_inventory(inventory, access_token)
-            
+
+            self._cached_inventory = inventory
+            self._cache_timestamp = datetime.now()
+            self._write_local_cache(inventory)
+            self._schedule_flush(access_token)
+            return True
+
         except Exception as e:
             self.logger.error(f"Error updating account inventory: {e}")
             return False
@@ -235,12 +299,98 @@ class InventoryManager:
             self.logger.error(f"Error getting account months: {e}")
             return {}
     
+    def flush(self, access_token: Optional[str] = None) -> bool:
+        """Upload any pending local inventory changes to SharePoint
+
+        Args:
+            access_token: OAuth access token; defaults to the token from
+                the most recent update
+
+        Returns:
+            bool: True if nothing was pending or the upload succeeded
+        """
+        with self._flush_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return True
+            token = access_token or self._pending_token
+
+        if not token or self._cached_inventory is None:
+            self.logger.warning("Cannot flush inventory: no token or cached data")
+            return False
+
+        return self.write_inventory(self._cached_inventory, token)
+
+    def _schedule_flush(self, access_token: str):
+        """Mark the inventory dirty and (re)start the debounced upload timer"""
+        with self._flush_lock:
+            self._dirty = True
+            self._pending_token = access_token
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+            self._flush_timer = threading.Timer(self.FLUSH_DELAY_SECONDS, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _read_local_cache(self) -> Optional[Dict[str, Any]]:
+        """Load the inventory from the local disk mirror if present"""
+        try:
+            if not os.path.exists(self._local_cache_path):
+                return None
+            with open(self._local_cache_path, 'rb') as f:
+                content = f.read()
+            inventory = orjson.loads(content) if orjson is not None else json.loads(content)
+            self.logger.debug(f"Loaded inventory from local cache: {self._local_cache_path}")
+            return inventory
+        except Exception as e:
+            self.logger.warning(f"Could not read local inventory cache: {e}")
+            return None
+
+    def _write_local_cache(self, inventory: Dict[str, Any]):
+        """Mirror the inventory to the local cache file"""
+        try:
+            os.makedirs(self.LOCAL_CACHE_DIR, exist_ok=True)
+            if orjson is not None:
+                payload = orjson.dumps(inventory, option=orjson.OPT_INDENT_2)
+            else:
+                payload = json.dumps(inventory, indent=2, ensure_ascii=False,
+                                     default=self._json_default).encode('utf-8')
+            with open(self._local_cache_path, 'wb') as f:
+                f.write(payload)
+        except Exception as e:
+            self.logger.warning(f"Could not write local inventory cache: {e}")
+
     def clear_cache(self):
-        """Clear the cached inventory"""
+        """Clear the cached inventory (in-memory and local mirror)"""
         self._cached_inventory = None
         self._cache_timestamp = None
+        try:
+            if os.path.exists(self._local_cache_path):
+                os.remove(self._local_cache_path)
+        except OSError as e:
+            self.logger.warning(f"Could not remove local inventory cache: {e}")
         self.logger.debug("Inventory cache cleared")
     
+    def _iter_inventory_json(self, inventory: Dict[str, Any]):
+        """Incrementally encode the inventory as UTF-8 JSON chunks
+
+        Keeps peak memory bounded to encoder chunks instead of the full
+        serialized blob; requests streams the generator to SharePoint
+        using chunked transfer encoding. FileInfo dataclass entries are
+        converted to dicts as they are encoded.
+        """
+        encoder = json.JSONEncoder(indent=2, ensure_ascii=False, default=self._json_default)
+        for chunk in encoder.iterencode(inventory):
+            yield chunk.encode('utf-8')
+
+    @staticmethod
+    def _json_default(obj: Any) -> Any:
+        if is_dataclass(obj):
+            return asdict(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
     def _create_empty_inventory(self) -> Dict[str, Any]:
         """Create an empty inventory structure"""
         return {
@@ -360,8 +510,12 @@ class InventoryManager:
             self.logger.error(f"Error finding inventory file: {e}")
             return None
     
-    def _upload_to_inventario_folder(self, file_content: bytes, access_token: str) -> bool:
-        """Upload inventory file to SharePoint Inventario folder"""
+    def _upload_to_inventario_folder(self, file_content, access_token: str) -> bool:
+        """Upload inventory file to SharePoint Inventario folder
+
+        Accepts bytes or an iterable of byte chunks; the latter is sent
+        with chunked transfer encoding.
+        """
         try:
             import requests
             headers = {'Authorization': f'Bearer {access_token}'}
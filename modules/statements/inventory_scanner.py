@@ -12,44 +12,91 @@ from typing import Dict, Any, List, Callable, Optional, Tuple
 from .config import UNIFIED_ACCOUNTS
 from .inventory_manager import InventoryManager, FileInfo
 
+# Import the existing STP/BBVA modules once at startup instead of inside
+# every per-account scan call; failures surface here rather than mid-scan
+from modules.stp.stp_files import get_stp_files
+from modules.stp.stp_database import get_parse_tracking_data
+
+try:
+    from modules.bbva.bbva_files import get_bbva_files
+    _HAS_BBVA_FILES = True
+except ImportError:
+    get_bbva_files = None
+    _HAS_BBVA_FILES = False
+
+try:
+    from modules.bbva.bbva_database import get_bbva_parse_tracking_data
+    _HAS_BBVA_TRACKING = True
+except ImportError:
+    get_bbva_parse_tracking_data = None
+    _HAS_BBVA_TRACKING = False
+
 logger = logging.getLogger(__name__)
 
+# Snapshot the account config once - it never changes after import, and the
+# scan loops re-read it inside progress callbacks on every iteration
+_UNIFIED_ACCOUNT_ITEMS = tuple(UNIFIED_ACCOUNTS.items())
+_UNIFIED_ACCOUNT_COUNT = len(_UNIFIED_ACCOUNT_ITEMS)
+
+# Matches the 'YYYY-MM' date_string produced by the file listing modules
+_YEAR_RE = re.compile(r'^(\d{4})-\d{2}$')
+
+# Tracking parse_status -> inventory parse_status (anything else is not_parsed)
+_PARSE_STATUS_MAP = {'success': 'parsed', 'error': 'error'}
+
 class InventoryScanner:
     """Scans SharePoint folders and builds inventory data"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__ + '.InventoryScanner')
         self.inventory_manager = InventoryManager()
+        # Dispatch on account type; new account types register here
+        self._scanners = {
+            'stp': self._scan_stp_account,
+            'bbva': self._scan_bbva_account,
+        }
     
-    def scan_all_accounts(self, access_token: str, 
-                         progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
+    def scan_all_accounts(self, access_token: str,
+                         progress_callback: Optional[Callable] = None,
+                         incremental: bool = False) -> Dict[str, Any]:
         """
         Scan all accounts and build complete inventory
-        
+
         Args:
             access_token: OAuth access token
             progress_callback: Function to call with progress updates
-            
+            incremental: If True, diff each account against the previous
+                inventory and reuse unchanged account data instead of
+                rebuilding it (skips the tracking-data fetch per account)
+
         Returns:
             Dict with scan results and statistics
         """
-        self.logger.info("Starting full inventory scan for all accounts")
-        
+        self.logger.info(f"Starting {'incremental' if incremental else 'full'} inventory scan for all accounts")
+
         if progress_callback:
             progress_callback({
                 'status': 'initializing',
                 'progress_percentage': 0,
                 'details': 'Initializing inventory scan...',
-                'total_accounts': len(UNIFIED_ACCOUNTS)
+                'total_accounts': _UNIFIED_ACCOUNT_COUNT
             })
-        
-        # Create empty inventory structure
+
+        # Load previous inventory for incremental scans, otherwise start empty
+        previous_accounts = {}
+        if incremental:
+            try:
+                previous_inventory = self.inventory_manager.read_inventory(access_token, force_refresh=True)
+                previous_accounts = previous_inventory.get('accounts', {})
+            except Exception as e:
+                self.logger.warning(f"Could not load previous inventory, falling back to full scan: {e}")
+
         inventory = {
             'last_updated': datetime.now().isoformat(),
             'version': '1.0',
             'accounts': {}
         }
-        
+
         results = {
             'success': True,
             'accounts_scanned': 0,
@@ -59,33 +106,32 @@ class InventoryScanner:
             'errors': []
         }
         
-        total_accounts = len(UNIFIED_ACCOUNTS)
-        
-        for idx, (account_id, account_config) in enumerate(UNIFIED_ACCOUNTS.items()):
+        total_accounts = _UNIFIED_ACCOUNT_COUNT
+
+        for idx, (account_id, account_config) in enumerate(_UNIFIED_ACCOUNT_ITEMS):
             try:
                 if progress_callback:
+                    account_name = account_config['name']
                     progress_callback({
                         'status': 'scanning_account',
                         'progress_percentage': int((idx / total_accounts) * 90),
-                        'details': f'Scanning {account_config["name"]} ({idx + 1}/{total_accounts})',
-                        'current_account': account_config["name"],
+                        'details': f'Scanning {account_name} ({idx + 1}/{total_accounts})',
+                        'current_account': account_name,
                         'accounts_processed': idx
                     })
                 
-                # Scan individual account
-                account_inventory = self._scan_single_account(account_id, account_config, access_token)
-                
-                if account_inventory:
+                # Scan individual account (reusing previous data when unchanged)
+                scan_result = self._scan_single_account(
+                    account_id, account_config, access_token,
+                    previous_inventory=previous_accounts.get(account_id)
+                )
+
+                if scan_result:
+                    account_inventory, stats = scan_result
                     inventory['accounts'][account_id] = account_inventory
                     results['accounts_scanned'] += 1
-                    
-                    # Count files for statistics
-                    for month_data in account_inventory.values():
-                        for file_type, file_info in month_data.items():
-                            if file_info and file_info.get('exists'):
-                                results['total_files_found'] += 1
-                                if file_info.get('parse_status') == 'parsed':
-                                    results['total_parsed_files'] += 1
+                    results['total_files_found'] += stats['files_found']
+                    results['total_parsed_files'] += stats['parsed_files']
                 else:
                     results['accounts_failed'] += 1
                     results['errors'].append(f"Failed to scan account: {account_id}")
@@ -154,9 +200,11 @@ class InventoryScanner:
         
         try:
             # Scan the account
-            account_inventory = self._scan_single_account(account_id, account_config, access_token)
-            
-            if account_inventory:
+            scan_result = self._scan_single_account(account_id, account_config, access_token)
+
+            if scan_result:
+                account_inventory, stats = scan_result
+
                 # Update inventory with new data
                 success = self.inventory_manager.update_account_inventory(
                     account_id, account_inventory, access_token
@@ -169,17 +217,10 @@ class InventoryScanner:
                         'details': f'Scan complete for {account_config["name"]}'
                     })
                 
-                # Calculate statistics
-                file_count = sum(
-                    1 for month_data in account_inventory.values()
-                    for file_info in month_data.values()
-                    if file_info and file_info.get('exists')
-                )
-                
                 return {
                     'success': success,
                     'account_id': account_id,
-                    'files_found': file_count,
+                    'files_found': stats['files_found'],
                     'error': None if success else 'Failed to update inventory'
                 }
             else:
@@ -200,140 +241,179 @@ class InventoryScanner:
             }
     
     def _scan_single_account(self, account_id: str, account_config: Dict[str, Any],
-                           access_token: str) -> Optional[Dict[str, Any]]:
+                           access_token: str,
+                           previous_inventory: Optional[Dict[str, Any]] = None) -> Optional[Tuple[Dict[str, Any], Dict[str, int]]]:
         """
         Internal method to scan a single account's files
-        
+
         Args:
             account_id: Account identifier
             account_config: Account configuration from UNIFIED_ACCOUNTS
             access_token: OAuth access token
-            
+            previous_inventory: Previous inventory data for this account;
+                when provided and the file listing is unchanged, it is
+                returned as-is instead of rebuilding
+
         Returns:
-            Dict with account inventory data or None if failed
+            Tuple of (account inventory data, stats dict) or None if failed
         """
         try:
             account_type = account_config['type']
-            
-            if account_type == 'stp':
-                return self._scan_stp_account(account_id, account_config, access_token)
-            elif account_type == 'bbva':
-                return self._scan_bbva_account(account_id, account_config, access_token)
-            else:
+
+            scanner = self._scanners.get(account_type)
+            if scanner is None:
                 self.logger.error(f"Unknown account type: {account_type}")
                 return None
-                
+
+            return scanner(account_id, account_config, access_token,
+                           previous_inventory=previous_inventory)
+
         except Exception as e:
             self.logger.error(f"Error in _scan_single_account for {account_id}: {e}")
             return None
-    
+
+    def _account_files_unchanged(self, all_files: List[Dict[str, Any]],
+                                previous_inventory: Dict[str, Any]) -> bool:
+        """Check whether a file listing matches the previous inventory exactly
+
+        Compares (month, extension, last_modified) of every listed file
+        against the stored inventory entries. A match means no file was
+        added, removed, or modified, so the previous account data can be
+        reused without re-fetching tracking data.
+        """
+        try:
+            listed = {}
+            for file_info in all_files:
+                date_string = file_info.get('date_string', '')
+                extension = file_info.get('extension', '')
+                if date_string and extension:
+                    listed[(date_string, extension)] = file_info.get('last_modified_formatted')
+
+            stored = {}
+            for month_key, month_data in previous_inventory.items():
+                for file_type, entry in month_data.items():
+                    if entry and entry.get('exists'):
+                        stored[(month_key, file_type)] = entry.get('last_modified')
+
+            return listed == stored
+
+        except Exception as e:
+            self.logger.debug(f"Could not compare against previous inventory: {e}")
+            return False
+
+    def _count_inventory_stats(self, account_inventory: Dict[str, Any]) -> Dict[str, int]:
+        """Count file statistics for an already-built account inventory
+
+        Only needed for reused (incremental) inventories - fresh scans
+        count inline while building.
+        """
+        files_found = 0
+        parsed_files = 0
+        for month_data in account_inventory.values():
+            for file_info in month_data.values():
+                if file_info and file_info.get('exists'):
+                    files_found += 1
+                    if file_info.get('parse_status') == 'parsed':
+                        parsed_files += 1
+        return {'files_found': files_found, 'parsed_files': parsed_files}
+
     def _scan_stp_account(self, account_id: str, account_config: Dict[str, Any],
-                        access_token: str) -> Optional[Dict[str, Any]]:
+                        access_token: str,
+                        previous_inventory: Optional[Dict[str, Any]] = None) -> Optional[Tuple[Dict[str, Any], Dict[str, int]]]:
         """Scan STP account using existing modules"""
         try:
-            # Import existing STP modules
-            from modules.stp.stp_files import get_stp_files
-            from modules.stp.stp_database import get_parse_tracking_data
-            
-            # Try to get database too for additional tracking info
-            try:
-                from modules.stp.stp_database import get_json_database
-                has_database = True
-            except ImportError:
-                has_database = False
-            
             account_number = account_config['identifier']
             self.logger.info(f"Scanning STP account: {account_id} ({account_number})")
             
             # Get all files
             all_files = get_stp_files(account_number, access_token)
-            
+
+            # Incremental scan: reuse previous data when nothing changed
+            if previous_inventory and self._account_files_unchanged(all_files, previous_inventory):
+                self.logger.info(f"No file changes for {account_id}, reusing previous inventory")
+                return previous_inventory, self._count_inventory_stats(previous_inventory)
+
             # Get parse tracking data
             try:
                 tracking_data = get_parse_tracking_data(access_token)
                 account_tracking = tracking_data.get(account_number, {})
                 
-                print(f"DEBUG STP: account_number = {account_number}")
-                print(f"DEBUG STP: tracking_data keys = {list(tracking_data.keys())}")
-                print(f"DEBUG STP: account_tracking = {account_tracking}")
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("STP tracking for %s: keys=%s, account_tracking=%s",
+                                      account_number, list(tracking_data.keys()), account_tracking)
                 
             except Exception as e:
                 self.logger.warning(f"Could not load parse tracking for {account_id}: {e}")
                 account_tracking = {}
             
-            # Build inventory structure
+            # Build inventory structure, counting statistics as we go
             inventory = {}
-            
-            # Process all years present in files
-            years_found = set()
+            files_found = 0
+            parsed_files = 0
+
+            # Index files by month in one pass instead of scanning the full
+            # list twice for every (year, month) combination
+            pdf_by_month = {}
+            xlsx_by_month = {}
             for file_info in all_files:
-                date_string = file_info.get('date_string', '')
-                if date_string:
-                    try:
-                        year = int(date_string.split('-')[0])
-                        years_found.add(year)
-                    except (ValueError, IndexError):
-                        continue
-            
-            # For each year found, process all 12 months
-            for year in years_found:
-                for month in range(1, 13):
-                    month_key = f"{year}-{month:02d}"
-                    
-                    # Find files for this month
-                    pdf_file = next((f for f in all_files 
-                                if f.get('date_string') == month_key and f.get('extension') == 'pdf'), None)
-                    xlsx_file = next((f for f in all_files 
-                                    if f.get('date_string') == month_key and f.get('extension') == 'xlsx'), None)
-                    
-                    month_data = {}
-                    
-                    # Process PDF file
-                    if pdf_file:
-                        month_data['pdf'] = self._create_file_info(
-                            pdf_file, account_tracking, 'pdf'
-                        )
-                    
-                    # Process XLSX file
-                    if xlsx_file:
-                        month_data['xlsx'] = self._create_file_info(
-                            xlsx_file, account_tracking, 'xlsx'
-                        )
-                    
-                    # Only add month if it has files
-                    if month_data:
-                        inventory[month_key] = month_data
-                        
-                        # DEBUG: Check for duplication in inventory
-                        if month_data.get('pdf') and month_data.get('xlsx'):
-                            pdf_count = month_data['pdf'].get('transaction_count', 0)
-                            xlsx_count = month_data['xlsx'].get('transaction_count', 0)
-                            print(f"INVENTORY DEBUG {account_id} {month_key}: PDF={pdf_count}, XLSX={xlsx_count}")
-                            
-                            if pdf_count > 0 and xlsx_count > 0:
-                                print(f"WARNING: Both PDF and XLSX have transaction counts - potential duplication!")
+                month_key = file_info.get('date_string', '')
+                if not _YEAR_RE.match(month_key):
+                    continue
+                extension = file_info.get('extension')
+                if extension == 'pdf':
+                    pdf_by_month[month_key] = file_info
+                elif extension == 'xlsx':
+                    xlsx_by_month[month_key] = file_info
+
+            # Only months that actually have files need an inventory entry
+            for month_key in sorted(pdf_by_month.keys() | xlsx_by_month.keys()):
+                pdf_file = pdf_by_month.get(month_key)
+                xlsx_file = xlsx_by_month.get(month_key)
+
+                month_data = {}
+
+                # Process PDF file
+                if pdf_file:
+                    entry = self._create_file_info(pdf_file, account_tracking, 'pdf')
+                    month_data['pdf'] = entry
+                    files_found += 1
+                    if entry.parse_status == 'parsed':
+                        parsed_files += 1
+
+                # Process XLSX file
+                if xlsx_file:
+                    entry = self._create_file_info(xlsx_file, account_tracking, 'xlsx')
+                    month_data['xlsx'] = entry
+                    files_found += 1
+                    if entry.parse_status == 'parsed':
+                        parsed_files += 1
+
+                inventory[month_key] = month_data
+
+                # Both PDF and XLSX carrying counts would double-count transactions
+                if month_data.get('pdf') and month_data.get('xlsx'):
+                    pdf_count = month_data['pdf'].get('transaction_count', 0)
+                    xlsx_count = month_data['xlsx'].get('transaction_count', 0)
+                    if pdf_count > 0 and xlsx_count > 0:
+                        self.logger.warning("Both PDF and XLSX have transaction counts for %s %s - potential duplication",
+                                            account_id, month_key)
             
             self.logger.info(f"STP scan complete for {account_id}: {len(inventory)} months with files")
-            return inventory
+            return inventory, {'files_found': files_found, 'parsed_files': parsed_files}
             
         except Exception as e:
             self.logger.error(f"Error scanning STP account {account_id}: {e}")
             return None
 
     def _scan_bbva_account(self, account_id: str, account_config: Dict[str, Any],
-                          access_token: str) -> Optional[Dict[str, Any]]:
+                          access_token: str,
+                          previous_inventory: Optional[Dict[str, Any]] = None) -> Optional[Tuple[Dict[str, Any], Dict[str, int]]]:
         """Scan BBVA account using existing modules"""
         try:
-            # Import existing BBVA modules  
-            from modules.bbva.bbva_files import get_bbva_files
-            
-            # Try to get parse tracking data
-            try:
-                from modules.bbva.bbva_database import get_bbva_parse_tracking_data
-                has_tracking = True
-            except ImportError:
-                has_tracking = False
-            
+            if not _HAS_BBVA_FILES:
+                self.logger.error(f"BBVA file module not available, cannot scan {account_id}")
+                return None
+
             clabe = account_config['identifier']
             self.logger.info(f"Scanning BBVA account: {account_id} ({clabe})")
             
@@ -346,10 +426,15 @@ class InventoryScanner:
             
             # Get all files
             all_files = get_bbva_files(clabe, access_token, account_info=account_info)
-            
+
+            # Incremental scan: reuse previous data when nothing changed
+            if previous_inventory and self._account_files_unchanged(all_files, previous_inventory):
+                self.logger.info(f"No file changes for {account_id}, reusing previous inventory")
+                return previous_inventory, self._count_inventory_stats(previous_inventory)
+
             # Get parse tracking data
             try:
-                if has_tracking:
+                if _HAS_BBVA_TRACKING:
                     tracking_data = get_bbva_parse_tracking_data(access_token)
                     account_tracking = tracking_data.get(clabe, {})
                 else:
@@ -358,19 +443,17 @@ class InventoryScanner:
                 self.logger.warning(f"Could not load BBVA parse tracking for {account_id}: {e}")
                 account_tracking = {}
             
-            # Build inventory structure
+            # Build inventory structure, counting statistics as we go
             inventory = {}
-            
+            files_found = 0
+            parsed_files = 0
+
             # Process all years present in files
             years_found = set()
             for file_info in all_files:
-                date_string = file_info.get('date_string', '')
-                if date_string:
-                    try:
-                        year = int(date_string.split('-')[0])
-                        years_found.add(year)
-                    except (ValueError, IndexError):
-                        continue
+                match = _YEAR_RE.match(file_info.get('date_string', ''))
+                if match:
+                    years_found.add(match.group(1))
             
             # For each year found, process all 12 months
             for year in years_found:
@@ -382,58 +465,56 @@ class InventoryScanner:
                                    if f.get('date_string') == month_key), None)
                     
                     if pdf_file:
-                        inventory[month_key] = {
-                            'pdf': self._create_file_info(pdf_file, account_tracking, 'pdf')
-                        }
+                        entry = self._create_file_info(pdf_file, account_tracking, 'pdf')
+                        inventory[month_key] = {'pdf': entry}
+                        files_found += 1
+                        if entry.parse_status == 'parsed':
+                            parsed_files += 1
             
             self.logger.info(f"BBVA scan complete for {account_id}: {len(inventory)} months with files")
-            return inventory
+            return inventory, {'files_found': files_found, 'parsed_files': parsed_files}
             
         except Exception as e:
             self.logger.error(f"Error scanning BBVA account {account_id}: {e}")
             return None
 
     def _create_file_info(self, file_data: Dict[str, Any], tracking_data: Dict[str, Any],
-                        file_type: str) -> Dict[str, Any]:
+                        file_type: str) -> FileInfo:
         filename = file_data.get('filename', '')
-        print(f"SCANNER DEBUG: Processing {filename}, file_type={file_type}")
+        self.logger.debug("Processing %s, file_type=%s", filename, file_type)
         
         # Get tracking info for this file
-        file_tracking = tracking_data.get(filename, {})
-        
+        file_tracking = tracking_data.get(filename)
+
         # FIXED: For STP PDF files, inherit tracking data from corresponding XLSX files
         inherited_from_xlsx = False
         if not file_tracking and filename.endswith('.pdf'):
             # Convert PDF filename to XLSX filename to find tracking data
             xlsx_filename = filename.replace('.pdf', '.xlsx')
-            file_tracking = tracking_data.get(xlsx_filename, {})
+            file_tracking = tracking_data.get(xlsx_filename)
             if file_tracking:
                 inherited_from_xlsx = True
                 self.logger.debug(f"PDF file {filename} inheriting parse status from XLSX {xlsx_filename}")
+
+        if file_tracking is None:
+            file_tracking = {}
+
+        # Determine parse status and transaction count via lookup table
+        parse_status = _PARSE_STATUS_MAP.get(file_tracking.get('parse_status'), 'not_parsed')
+
+        if parse_status == 'parsed' and not inherited_from_xlsx:
+            transaction_count = file_tracking.get('transaction_count', 0)
+        else:
+            # Error/unparsed files have 0 transactions; inherited PDF status
+            # keeps 0 to avoid double-counting the XLSX transactions
+            transaction_count = 0
         
-        # Determine parse status and transaction count
-        parse_status = 'not_parsed'
-        transaction_count = 0
-        
-        if file_tracking:
-            if file_tracking.get('parse_status') == 'success':
-                parse_status = 'parsed'
-                # FIXED: For STP PDF files that inherited from XLSX, don't copy transaction count
-                # This prevents duplication since PDF and XLSX would have the same count
-                if inherited_from_xlsx:
-                    transaction_count = 0  # Avoid duplication - PDF inherits status but not count
-                    self.logger.debug(f"PDF file {filename} set to 0 transactions to avoid duplication")
-                else:
-                    transaction_count = file_tracking.get('transaction_count', 0)
-            elif file_tracking.get('parse_status') == 'error':
-                parse_status = 'error'
-                # Error files have 0 transactions regardless
-                transaction_count = 0
-        
-        return {
-            'exists': True,
-            'last_modified': file_data.get('last_modified_formatted'),
-            'parse_status': parse_status,
-            'transaction_count': transaction_count,
-            'file_size': file_data.get('size')
-        }
\ No newline at end of file
+        # Slotted dataclass instead of a dict - a fraction of the per-file
+        # memory during a full scan; serialized back to a dict on write
+        return FileInfo(
+            exists=True,
+            last_modified=file_data.get('last_modified_formatted'),
+            parse_status=parse_status,
+            transaction_count=transaction_count,
+            file_size=file_data.get('size')
+        )
\ No newline at end of file
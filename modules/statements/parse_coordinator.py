@@ -4,16 +4,78 @@ Phase 1b: Clean Parse Coordinator for Unified Statements
 Dispatches parse operations to existing STP/BBVA parsers without modifying them
 """
 
+import concurrent.futures
+import heapq
 import logging
 import threading
 import time
 from datetime import datetime
-from typing import Dict, Any, Callable, Optional
+from typing import Dict, Any, Callable
 
 from .config import UNIFIED_ACCOUNTS, get_account_by_id
 
+from modules.stp.stp_files import get_stp_files, get_file_content_by_ids
+from modules.stp.stp_database import (
+    get_json_database, update_json_database, get_parse_tracking_data,
+    update_parse_tracking_data, remove_file_transactions,
+    synchronize_database_with_files
+)
+from modules.stp.stp_parser import parse_excel_file, check_file_parsing_status
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# BBVA modules are optional; the parse paths degrade gracefully when absent
+try:
+    from modules.bbva.bbva_batch import process_bbva_account
+except ImportError:
+    process_bbva_account = None
+
+try:
+    from modules.bbva.bbva_files import get_bbva_files
+    from modules.bbva.bbva_database import get_bbva_database
+except ImportError:
+    get_bbva_files = None
+    get_bbva_database = None
+
 logger = logging.getLogger(__name__)
 
+def _noop_progress(_progress_data):
+    """Default progress callback; lets the parse paths call the callback
+    unconditionally instead of branching on None at every phase"""
+    pass
+
+# Sort key for transaction lists; module-level so the hot paths don't
+# rebuild it. Dates can be None (unparseable rows), so a plain
+# itemgetter would raise on str/None comparison.
+def _tx_sort_key(tx):
+    return tx.get('fecha_operacion') or '1900-01-01'
+
+
+class _AccountProgress:
+    """Per-account progress adapter used by parse_all_accounts
+
+    A slotted callable instead of a nested closure: the account name is
+    bound explicitly at construction (no shared loop variable under
+    concurrency) and nothing is re-allocated per progress event.
+    """
+    __slots__ = ('account_name', 'outer_callback', 'completed_count', 'total')
+
+    def __init__(self, account_name, outer_callback, completed_count, total):
+        self.account_name = account_name
+        self.outer_callback = outer_callback
+        self.completed_count = completed_count
+        self.total = total
+
+    def __call__(self, progress_data):
+        if self.outer_callback:
+            progress_data['current_account'] = self.account_name
+            progress_data['account_progress'] = progress_data.get('progress_percentage', 0)
+            progress_data['overall_progress'] = int((self.completed_count() / self.total) * 100)
+            self.outer_callback(progress_data)
+
 class UnifiedParseCoordinator:
     """Clean coordinator that dispatches to existing parsers"""
     
@@ -21,20 +83,22 @@ class UnifiedParseCoordinator:
         self.logger = logging.getLogger(__name__ + '.UnifiedParseCoordinator')
         self.active_sessions = {}
     
-    def parse_account(self, account_id: str, access_token: str, 
-                     progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
+    def parse_account(self, account_id: str, access_token: str,
+                     progress_callback: Callable = _noop_progress) -> Dict[str, Any]:
         """
         Parse a single account using existing parser systems
-        
+
         Args:
             account_id: Account ID from UNIFIED_ACCOUNTS
             access_token: OAuth access token
             progress_callback: Function to call with progress updates
-            
+
         Returns:
             Dict with parse results
         """
-        
+        if progress_callback is None:
+            progress_callback = _noop_progress
+
         if account_id not in UNIFIED_ACCOUNTS:
             raise ValueError(f"Invalid account ID: {account_id}")
         
@@ -44,12 +108,11 @@ class UnifiedParseCoordinator:
         self.logger.info(f"Starting parse for {account_type} account: {account_id}")
         
         # Update progress
-        if progress_callback:
-            progress_callback({
-                'status': 'starting',
-                'progress_percentage': 10,
-                'details': f'Starting {account_type.upper()} parse for {account_config["name"]}'
-            })
+        progress_callback({
+            'status': 'starting',
+            'progress_percentage': 10,
+            'details': f'Starting {account_type.upper()} parse for {account_config["name"]}'
+        })
         
         try:
             if account_type == 'stp':
@@ -61,71 +124,57 @@ class UnifiedParseCoordinator:
                 
         except Exception as e:
             self.logger.error(f"Parse failed for account {account_id}: {e}")
-            if progress_callback:
-                progress_callback({
-                    'status': 'error',
-                    'progress_percentage': 0,
-                    'details': f'Parse failed: {str(e)}',
-                    'error': str(e)
-                })
+            progress_callback({
+                'status': 'error',
+                'progress_percentage': 0,
+                'details': f'Parse failed: {str(e)}',
+                'error': str(e)
+            })
             raise
     
     def _parse_stp_account(self, account_id: str, account_config: Dict[str, Any], 
-                          access_token: str, progress_callback: Optional[Callable]) -> Dict[str, Any]:
+                          access_token: str, progress_callback: Callable) -> Dict[str, Any]:
         """Parse STP account using existing STP modules"""
-        
-        # Import existing STP modules
-        from modules.stp.stp_files import get_stp_files
-        from modules.stp.stp_database import (
-            get_json_database, update_json_database, get_parse_tracking_data,
-            update_parse_tracking_data, remove_file_transactions,
-            synchronize_database_with_files
-        )
-        from modules.stp.stp_parser import parse_excel_file, check_file_parsing_status
-        from modules.stp.stp_files import get_file_content_by_ids
-        
+
         account_number = account_config['identifier']
         
         # Phase 1: Get files
-        if progress_callback:
-            progress_callback({
-                'status': 'fetching_files',
-                'progress_percentage': 20,
-                'details': 'Retrieving files from SharePoint...'
-            })
+        progress_callback({
+            'status': 'fetching_files',
+            'progress_percentage': 20,
+            'details': 'Retrieving files from SharePoint...'
+        })
         
         all_files = get_stp_files(account_number, access_token)
-        excel_files = [f for f in all_files if f.get('extension') == 'xlsx']
+        # get_stp_files guarantees the 'extension' key, so index directly
+        excel_files = [f for f in all_files if f['extension'] == 'xlsx']
         
         # Phase 2: Check database
-        if progress_callback:
-            progress_callback({
-                'status': 'checking_database',
-                'progress_percentage': 30,
-                'details': 'Synchronizing database...'
-            })
+        progress_callback({
+            'status': 'checking_database',
+            'progress_percentage': 30,
+            'details': 'Synchronizing database...'
+        })
         
         database = get_json_database(account_number, access_token)
         database = synchronize_database_with_files(database, all_files, account_number)
         
         # Phase 3: Check which files need parsing
-        if progress_callback:
-            progress_callback({
-                'status': 'checking_files',
-                'progress_percentage': 40,
-                'details': f'Checking {len(excel_files)} files...'
-            })
+        progress_callback({
+            'status': 'checking_files',
+            'progress_percentage': 40,
+            'details': f'Checking {len(excel_files)} files...'
+        })
         
         tracking_data = get_parse_tracking_data(access_token)
         files_to_parse = check_file_parsing_status(excel_files, tracking_data, account_number)
         
         if not files_to_parse:
-            if progress_callback:
-                progress_callback({
-                    'status': 'completed',
-                    'progress_percentage': 100,
-                    'details': f'All {len(excel_files)} files are up to date'
-                })
+            progress_callback({
+                'status': 'completed',
+                'progress_percentage': 100,
+                'details': f'All {len(excel_files)} files are up to date'
+            })
             
             return {
                 'success': True,
@@ -138,90 +187,135 @@ class UnifiedParseCoordinator:
             }
         
         # Phase 4: Parse files
-        if progress_callback:
-            progress_callback({
-                'status': 'processing_files',
-                'progress_percentage': 50,
-                'details': f'Processing {len(files_to_parse)} files...',
-                'total_files': len(files_to_parse)
-            })
+        progress_callback({
+            'status': 'processing_files',
+            'progress_percentage': 50,
+            'details': f'Processing {len(files_to_parse)} files...',
+            'total_files': len(files_to_parse)
+        })
         
-        # Initialize tracking if needed
-        if account_number not in tracking_data:
-            tracking_data[account_number] = {}
+        # Bind the per-account tracking dict once for the file loop
+        acct_tracking = tracking_data.setdefault(account_number, {})
         
         files_processed = 0
         total_transactions_added = 0
         errors = []
-        
-        for idx, file_info in enumerate(files_to_parse):
-            try:
-                filename = file_info['filename']
-                
-                if progress_callback:
-                    progress_callback({
-                        'status': 'processing_files',
-                        'current_file': filename,
-                        'files_processed': files_processed,
-                        'progress_percentage': 50 + int((idx / len(files_to_parse)) * 40),
-                        'details': f'Processing {filename} ({idx + 1}/{len(files_to_parse)})'
-                    })
-                
-                # Download and parse file
-                file_content = get_file_content_by_ids(
-                    file_info['drive_id'], 
-                    file_info['file_id'], 
-                    access_token
-                )
-                
-                if file_content:
-                    # Remove old transactions from this file
-                    database = remove_file_transactions(database, filename)
-                    
-                    # Parse file
-                    transactions = parse_excel_file(file_content, filename)
-                    
-                    if transactions:
-                        database['transactions'].extend(transactions)
-                        total_transactions_added += len(transactions)
-                        
-                        # Sort transactions
-                        database['transactions'].sort(
-                            key=lambda x: x.get('fecha_operacion') or '1900-01-01',
-                            reverse=True
-                        )
-                    
-                    # Update tracking
-                    tracking_data[account_number][filename] = {
-                        'last_parsed': datetime.now().isoformat(),
-                        'file_last_modified': file_info.get('last_modified_formatted'),
-                        'transaction_count': len(transactions) if transactions else 0,
-                        'parse_status': 'success'
-                    }
-                    
-                    files_processed += 1
-                
-            except Exception as e:
-                error_msg = f"Error processing {filename}: {str(e)}"
-                errors.append(error_msg)
-                self.logger.error(error_msg)
-        
+        new_runs = []
+        # One timestamp for the whole parse batch; per-file
+        # datetime.now() calls added nothing but clock overhead
+        parse_ts = datetime.now().isoformat()
+        
+        # Overlap the per-file downloads in a thread pool; parsing and
+        # database mutation stay on this thread so `database` and
+        # `tracking_data` are never touched concurrently. Downloads are
+        # submitted in a sliding window of max_workers so at most that
+        # many downloaded files are held in memory at once, instead of
+        # every file in the batch sitting in a completed Future.
+        max_workers = 8
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            file_iter = iter(files_to_parse)
+            pending = {}
+
+            def submit_next():
+                file_info = next(file_iter, None)
+                if file_info is not None:
+                    future = executor.submit(get_file_content_by_ids,
+                                             file_info['drive_id'],
+                                             file_info['file_id'],
+                                             access_token)
+                    pending[future] = file_info
+
+            for _ in range(max_workers):
+                submit_next()
+
+            idx = 0
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    file_info = pending.pop(future)
+                    submit_next()
+                    filename = file_info['filename']
+                    try:
+                        progress_callback({
+                            'status': 'processing_files',
+                            'current_file': filename,
+                            'files_processed': files_processed,
+                            'progress_percentage': 50 + int((idx / len(files_to_parse)) * 40),
+                            'details': f'Processing {filename} ({idx + 1}/{len(files_to_parse)})'
+                        })
+
+                        file_content = future.result()
+                        # Release the future so the downloaded bytes
+                        # are not pinned while this file is parsed
+                        future = None
+
+                        if file_content:
+                            # Remove old transactions from this file
+                            database = remove_file_transactions(database, filename)
+
+                            # Parse file
+                            transactions = parse_excel_file(file_content, filename)
+
+                            if transactions:
+                                # Sort the per-file run now; the runs are
+                                # merged with the database in one pass below
+                                transactions.sort(key=_tx_sort_key, reverse=True)
+                                new_runs.append(transactions)
+                                total_transactions_added += len(transactions)
+
+                            # Update tracking
+                            acct_tracking[filename] = {
+                                'last_parsed': parse_ts,
+                                'file_last_modified': file_info.get('last_modified_formatted'),
+                                'transaction_count': len(transactions) if transactions else 0,
+                                'parse_status': 'success'
+                            }
+
+                            files_processed += 1
+
+                    except Exception as e:
+                        error_msg = f"Error processing {filename}: {str(e)}"
+                        errors.append(error_msg)
+                        self.logger.error(error_msg)
+
+                    idx += 1
+        
+        # The existing database is already in descending date order and
+        # each new run was sorted above, so an N-way merge is linear in
+        # total rows instead of a full O(n log n) re-sort
+        if new_runs:
+            database['transactions'] = list(heapq.merge(
+                database['transactions'], *new_runs,
+                key=_tx_sort_key, reverse=True
+            ))
+
         # Phase 5: Save results
-        if progress_callback:
-            progress_callback({
-                'status': 'saving',
-                'progress_percentage': 95,
-                'details': 'Saving results...'
-            })
+        progress_callback({
+            'status': 'saving',
+            'progress_percentage': 95,
+            'details': 'Saving results...'
+        })
         
         # Update database metadata
         database['metadata']['files_parsed'] = files_processed
         database['metadata']['last_updated'] = datetime.now().isoformat()
         database['metadata']['total_transactions'] = len(database['transactions'])
-        
-        # Save database and tracking
-        update_json_database(account_number, database, access_token)
-        update_parse_tracking_data(tracking_data, access_token)
+
+        # Pre-encode the database once, since metadata is already
+        # current here; update_json_database uploads the bytes as-is
+        # instead of stamping metadata again and re-encoding
+        db_payload = database if orjson is None else orjson.dumps(database)
+
+        # Save database and tracking - independent uploads, so overlap
+        # them instead of paying both latencies back to back
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as save_pool:
+            save_futures = [
+                save_pool.submit(update_json_database, account_number, db_payload, access_token),
+                save_pool.submit(update_parse_tracking_data, tracking_data, access_token),
+            ]
+            for save_future in concurrent.futures.as_completed(save_futures):
+                save_future.result()
         
         result = {
             'success': True,
@@ -235,48 +329,62 @@ class UnifiedParseCoordinator:
             'account_type': 'stp'
         }
         
-        if progress_callback:
-            progress_callback({
-                'status': 'completed',
-                'progress_percentage': 100,
-                'details': f'Completed: {files_processed} files processed, {total_transactions_added} transactions added',
-                'files_processed': files_processed,
-                'transactions_added': total_transactions_added
-            })
+        progress_callback({
+            'status': 'completed',
+            'progress_percentage': 100,
+            'details': f'Completed: {files_processed} files processed, {total_transactions_added} transactions added',
+            'files_processed': files_processed,
+            'transactions_added': total_transactions_added
+        })
         
         return result
 
     def _parse_bbva_account(self, account_id: str, account_config: Dict[str, Any], 
-                        access_token: str, progress_callback: Optional[Callable]) -> Dict[str, Any]:
+                        access_token: str, progress_callback: Callable) -> Dict[str, Any]:
         """Parse BBVA account using existing BBVA modules - FIXED VERSION"""
         
         clabe = account_config['identifier']
         
-        if progress_callback:
+        progress_callback({
+            'status': 'initializing',
+            'progress_percentage': 10,
+            'details': 'Starting BBVA parse process...'
+        })
+        
+        if process_bbva_account is None:
+            # bbva_batch failed to import at module load
+            self.logger.error("BBVA batch processor not available")
+
             progress_callback({
-                'status': 'initializing',
-                'progress_percentage': 10,
-                'details': 'Starting BBVA parse process...'
+                'status': 'error',
+                'progress_percentage': 0,
+                'details': 'BBVA batch processor not available',
+                'error': 'Required BBVA parsing modules are missing'
             })
-        
+
+            return {
+                'success': False,
+                'error': 'BBVA batch processor not available - required modules missing',
+                'files_processed': 0,
+                'transactions_added': 0,
+                'account_id': account_id,
+                'account_type': 'bbva'
+            }
+
         try:
-            # Import the BBVA batch processor - THIS IS THE KEY FIX
-            from modules.bbva.bbva_batch import process_bbva_account
-            
             # Create a wrapper progress callback for the existing BBVA system
             def bbva_progress_wrapper(progress_data):
-                if progress_callback:
-                    # Map BBVA progress data to our standard format
-                    mapped_progress = {
-                        'status': progress_data.get('status', 'processing'),
-                        'progress_percentage': progress_data.get('progress_percentage', 50),
-                        'current_file': progress_data.get('current_file'),
-                        'files_processed': progress_data.get('files_processed', 0),
-                        'total_files': progress_data.get('total_files', 0),
-                        'transactions_added': progress_data.get('transactions_added', 0),
-                        'details': progress_data.get('details', 'Processing BBVA account...')
-                    }
-                    progress_callback(mapped_progress)
+                # Map BBVA progress data to our standard format
+                mapped_progress = {
+                    'status': progress_data.get('status', 'processing'),
+                    'progress_percentage': progress_data.get('progress_percentage', 50),
+                    'current_file': progress_data.get('current_file'),
+                    'files_processed': progress_data.get('files_processed', 0),
+                    'total_files': progress_data.get('total_files', 0),
+                    'transactions_added': progress_data.get('transactions_added', 0),
+                    'details': progress_data.get('details', 'Processing BBVA account...')
+                }
+                progress_callback(mapped_progress)
             
             # Use the existing BBVA batch processor (which has proper parse tracking)
             result = process_bbva_account(clabe, access_token, bbva_progress_wrapper)
@@ -286,37 +394,15 @@ class UnifiedParseCoordinator:
             result['account_type'] = 'bbva'
             
             return result
-            
-        except ImportError as e:
-            # If bbva_batch is not available, provide a clear error
-            self.logger.error(f"BBVA batch processor not available: {e}")
-            
-            if progress_callback:
-                progress_callback({
-                    'status': 'error',
-                    'progress_percentage': 0,
-                    'details': 'BBVA batch processor not available',
-                    'error': 'Required BBVA parsing modules are missing'
-                })
-            
-            return {
-                'success': False,
-                'error': 'BBVA batch processor not available - required modules missing',
-                'files_processed': 0,
-                'transactions_added': 0,
-                'account_id': account_id,
-                'account_type': 'bbva'
-            }
-            
+
         except Exception as e:
             self.logger.error(f"BBVA parsing failed: {e}")
             
-            if progress_callback:
-                progress_callback({
-                    'status': 'error',
-                    'progress_percentage': 0,
-                    'details': f'BBVA parsing failed: {str(e)}'
-                })
+            progress_callback({
+                'status': 'error',
+                'progress_percentage': 0,
+                'details': f'BBVA parsing failed: {str(e)}'
+            })
             
             return {
                 'success': False,
@@ -328,23 +414,21 @@ class UnifiedParseCoordinator:
             }
 
     def _parse_bbva_account_basic(self, account_id: str, account_config: Dict[str, Any], 
-                                 access_token: str, progress_callback: Optional[Callable]) -> Dict[str, Any]:
+                                 access_token: str, progress_callback: Callable) -> Dict[str, Any]:
         """Basic BBVA parsing when advanced batch processor is not available"""
         
         clabe = account_config['identifier']
         
-        if progress_callback:
-            progress_callback({
-                'status': 'basic_processing',
-                'progress_percentage': 50,
-                'details': 'Using basic BBVA processing...'
-            })
+        progress_callback({
+            'status': 'basic_processing',
+            'progress_percentage': 50,
+            'details': 'Using basic BBVA processing...'
+        })
         
         try:
-            # Import what's available
-            from modules.bbva.bbva_files import get_bbva_files
-            from modules.bbva.bbva_database import get_bbva_database
-            
+            if get_bbva_files is None or get_bbva_database is None:
+                raise ImportError("BBVA file/database modules not available")
+
             # Create account_info for get_bbva_files
             account_info = {
                 'name': account_config['name'],
@@ -354,17 +438,18 @@ class UnifiedParseCoordinator:
             
             # Get files
             files = get_bbva_files(clabe, access_token, account_info=account_info)
-            pdf_files = [f for f in files if f.get('filename', '').lower().endswith('.pdf')]
+            # get_bbva_files normalizes 'extension' to lowercase on
+            # ingest, so no per-file filename lowercasing is needed here
+            pdf_files = [f for f in files if f['extension'] == 'pdf']
             
             # Get database
             database = get_bbva_database(clabe, access_token)
             
-            if progress_callback:
-                progress_callback({
-                    'status': 'completed',
-                    'progress_percentage': 100,
-                    'details': f'Found {len(pdf_files)} PDF files. Advanced parsing not yet available.'
-                })
+            progress_callback({
+                'status': 'completed',
+                'progress_percentage': 100,
+                'details': f'Found {len(pdf_files)} PDF files. Advanced parsing not yet available.'
+            })
             
             return {
                 'success': True,
@@ -381,12 +466,11 @@ class UnifiedParseCoordinator:
         except Exception as e:
             self.logger.error(f"Basic BBVA processing failed: {e}")
             
-            if progress_callback:
-                progress_callback({
-                    'status': 'error',
-                    'progress_percentage': 0,
-                    'details': f'BBVA processing failed: {str(e)}'
-                })
+            progress_callback({
+                'status': 'error',
+                'progress_percentage': 0,
+                'details': f'BBVA processing failed: {str(e)}'
+            })
             
             return {
                 'success': False,
@@ -397,67 +481,96 @@ class UnifiedParseCoordinator:
                 'account_type': 'bbva'
             }
     
-    def parse_all_accounts(self, access_token: str, 
-                          progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
-        """Parse all accounts in the unified system"""
-        
+    def parse_all_accounts(self, access_token: str,
+                          progress_callback: Callable = _noop_progress) -> Dict[str, Any]:
+        """Parse all accounts in the unified system
+
+        Accounts that share a parse-tracking file must not run
+        concurrently: each parse does a whole-file read-modify-write of
+        its tracking JSON, so two accounts of the same type racing would
+        overwrite each other's just-recorded statuses (last writer
+        wins). Accounts are therefore grouped by type - STP and BBVA
+        keep separate tracking files - and each group runs sequentially
+        on its own worker, with the groups overlapping each other.
+        """
+        if progress_callback is None:
+            progress_callback = _noop_progress
+
         self.logger.info("Starting batch parse for all accounts")
-        
-        if progress_callback:
-            progress_callback({
-                'status': 'initializing_batch',
-                'progress_percentage': 0,
-                'details': f'Starting batch parse for {len(UNIFIED_ACCOUNTS)} accounts'
-            })
-        
+
+        progress_callback({
+            'status': 'initializing_batch',
+            'progress_percentage': 0,
+            'details': f'Starting batch parse for {len(UNIFIED_ACCOUNTS)} accounts'
+        })
+
         results = {}
         total_accounts = len(UNIFIED_ACCOUNTS)
-        
-        for idx, (account_id, account_config) in enumerate(UNIFIED_ACCOUNTS.items()):
+        results_lock = threading.Lock()
+
+        def completed_count():
+            with results_lock:
+                return len(results)
+
+        def parse_one(account_id, account_config):
             account_name = account_config['name']
-            
-            if progress_callback:
-                progress_callback({
-                    'status': 'processing_account',
-                    'progress_percentage': int((idx / total_accounts) * 100),
-                    'details': f'Processing {account_name} ({idx + 1}/{total_accounts})',
-                    'current_account': account_name
-                })
-            
             try:
-                # Create account-specific progress callback
-                def account_progress(progress_data):
-                    if progress_callback:
-                        progress_data['current_account'] = account_name
-                        progress_data['account_progress'] = progress_data.get('progress_percentage', 0)
-                        progress_data['overall_progress'] = int((idx / total_accounts) * 100)
-                        progress_callback(progress_data)
-                
-                # Parse individual account
-                result = self.parse_account(account_id, access_token, account_progress)
-                results[account_id] = result
-                
+                return self.parse_account(
+                    account_id, access_token,
+                    _AccountProgress(account_name, progress_callback,
+                                     completed_count, total_accounts)
+                )
             except Exception as e:
                 self.logger.error(f"Failed to parse account {account_id}: {e}")
-                results[account_id] = {
+                return {
                     'success': False,
                     'error': str(e),
                     'account_id': account_id,
                     'account_type': account_config['type']
                 }
-        
-        # Calculate summary
-        successful_accounts = len([r for r in results.values() if r.get('success')])
+
+        def parse_group(group):
+            # One tracking file per group: accounts run one at a time
+            # so each read-modify-write sees the previous account's
+            # update
+            for account_id, account_config in group:
+                result = parse_one(account_id, account_config)
+                with results_lock:
+                    results[account_id] = result
+                    completed = len(results)
+
+                progress_callback({
+                    'status': 'processing_account',
+                    'progress_percentage': int((completed / total_accounts) * 100),
+                    'details': f'Completed {account_config["name"]} ({completed}/{total_accounts})',
+                    'current_account': account_config['name']
+                })
+
+        groups = {}
+        for account_id, account_config in UNIFIED_ACCOUNTS.items():
+            groups.setdefault(account_config['type'], []).append((account_id, account_config))
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(groups)) as executor:
+            group_futures = [executor.submit(parse_group, group) for group in groups.values()]
+            for future in concurrent.futures.as_completed(group_futures):
+                future.result()
+        
+        # Calculate summary in a single pass over the results
+        successful_accounts = 0
+        total_files_processed = 0
+        total_transactions_added = 0
+        for result in results.values():
+            successful_accounts += bool(result.get('success'))
+            total_files_processed += result.get('files_processed', 0)
+            total_transactions_added += result.get('transactions_added', 0)
         failed_accounts = total_accounts - successful_accounts
-        total_files_processed = sum(r.get('files_processed', 0) for r in results.values())
-        total_transactions_added = sum(r.get('transactions_added', 0) for r in results.values())
         
-        if progress_callback:
-            progress_callback({
-                'status': 'completed',
-                'progress_percentage': 100,
-                'details': f'Batch parse complete: {successful_accounts}/{total_accounts} accounts successful'
-            })
+        progress_callback({
+            'status': 'completed',
+            'progress_percentage': 100,
+            'details': f'Batch parse complete: {successful_accounts}/{total_accounts} accounts successful'
+        })
         
         return {
             'success': failed_accounts == 0,
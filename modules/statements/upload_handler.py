@@ -5,24 +5,332 @@ Auto-detects file types, uploads to correct locations, and updates calendar
 FIXED: Now includes immediate inventory refresh after upload
 """
 
+import functools
 import re
 import logging
-import tempfile
 import os
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter, Retry
+from urllib.parse import quote
+from types import MappingProxyType
 from typing import Dict, Any, Optional
 from werkzeug.datastructures import FileStorage
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from .config import UNIFIED_ACCOUNTS, get_account_by_identifier
 
 logger = logging.getLogger(__name__)
 
-class UnifiedUploadHandler:
-    """Clean upload handler with auto-detection and calendar updates"""
+# Singletons shared across uploads - both classes are stateless apart
+# from their caches, and constructing them per request paid the import
+# machinery inside the handler
+try:
+    from .inventory_manager import InventoryManager
+    from .inventory_scanner import InventoryScanner
+    _inventory_manager = InventoryManager()
+    _inventory_scanner = InventoryScanner()
+except ImportError as e:
+    logger.warning("Inventory modules unavailable: %s", e)
+    _inventory_manager = None
+    _inventory_scanner = None
+
+try:
+    from modules.stp.stp_files import upload_to_sharepoint
+except ImportError as e:
+    logger.warning("STP upload module unavailable: %s", e)
+    upload_to_sharepoint = None
+
+try:
+    from modules.shared.performance_cache import unified_cache
+except ImportError as e:
+    logger.warning("Performance cache unavailable: %s", e)
+    unified_cache = None
+
+# Shared session so the folder lookups and the final PUT of one upload
+# reuse a single pooled TLS connection instead of handshaking per call;
+# transient Graph throttling/5xx responses are retried with backoff
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.3,
+                      status_forcelist=[429, 502, 503, 504],
+                      allowed_methods=['GET', 'PUT'])
+))
+
+# (connect, read) timeouts for Graph metadata calls - a hung endpoint
+# must not pin a worker thread indefinitely
+_GRAPH_TIMEOUT = (5, 15)
+
+# Children listings only need these fields to locate a folder; the
+# default payload ships full metadata for every sibling file
+_CHILDREN_SELECT = '?$select=id,name,folder'
+
+def _parse_graph_json(response) -> Dict[str, Any]:
+    """Parse a Graph response body, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+# STP files: ec-[account]-YYYYMM.ext. Compiled once - _detect_file_type
+# runs on every upload and on frontend live validation. The year/month
+# alternations validate the period inside the DFA (no int() + range
+# branch afterwards) and re.ASCII skips the Unicode \d tables.
+_STP_RE = re.compile(r'ec-(\d{18})-(20\d\d)(0[1-9]|1[0-2])\.(pdf|xlsx|xls)', re.ASCII)
+
+# CLABEs are 18 consecutive digits; used for the first-page fast path
+# in BBVA auto-detection
+_CLABE_RE = re.compile(r'\b\d{18}\b')
+
+# File signatures checked before any parsing or network work - a
+# mislabeled upload fails in microseconds instead of after a Graph
+# round-trip or a pdfplumber crash
+_PDF_MAGIC = b'%PDF-'
+_ZIP_MAGIC = b'PK\x03\x04'          # xlsx is a zip container
+_OLE2_MAGIC = b'\xd0\xcf\x11\xe0'   # legacy .xls compound document
+
+def _has_valid_magic(head: bytes, extension: str) -> bool:
+    if extension == 'pdf':
+        return head.startswith(_PDF_MAGIC)
+    if extension == 'xlsx':
+        return head.startswith(_ZIP_MAGIC)
+    if extension == 'xls':
+        return head.startswith((_OLE2_MAGIC, _ZIP_MAGIC))
+    return True
+
+# Static format metadata served by the formats endpoint; read-only so it
+# is built once instead of re-allocating the nested dicts per request
+_SUPPORTED_FORMATS = MappingProxyType({
+    'stp': {
+        'pattern': 'ec-[account]-YYYYMM.xlsx/pdf',
+        'example': 'ec-646180559700000009-202501.xlsx',
+        'extensions': ['xlsx', 'pdf'],
+        'description': 'STP Excel statements and PDF exports'
+    },
+    'bbva': {
+        'pattern': 'Any PDF file for auto-detection',
+        'example': '2508 FSA BBVA MXN.pdf',
+        'extensions': ['pdf'],
+        'description': 'BBVA PDF bank statements with auto-detection support'
+    }
+})
+
+# SharePoint folder structure is effectively static, so folder-ID
+# lookups are cached under a 15-minute lease - repeat uploads skip the
+# children round-trips and go straight to the PUT. Entries are dropped
+# wholesale when an upload hits a 404 (folder moved/renamed).
+_FOLDER_TTL_SECONDS = 900
+_folder_cache_lock = threading.Lock()
+_folder_id_cache: Dict[tuple, tuple] = {}
+
+def _folder_cache_get(drive_id: str, parent_id: str, name: str) -> Optional[str]:
+    with _folder_cache_lock:
+        entry = _folder_id_cache.get((drive_id, parent_id, name))
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+    return None
+
+def _folder_cache_peek(drive_id: str, parent_id: str, name: str):
+    """Return (folder_id, etag, fresh) even for expired entries
+
+    Expired entries keep their ETag so the revalidation request can be
+    conditional - a 304 then renews the lease without re-transferring
+    and re-parsing the item body.
+    """
+    with _folder_cache_lock:
+        entry = _folder_id_cache.get((drive_id, parent_id, name))
+        if entry is None:
+            return None, None, False
+        return entry[0], entry[2], entry[1] > time.monotonic()
+
+def _folder_cache_put(drive_id: str, parent_id: str, name: str,
+                      folder_id: str, etag: Optional[str] = None):
+    with _folder_cache_lock:
+        _folder_id_cache[(drive_id, parent_id, name)] = (
+            folder_id, time.monotonic() + _FOLDER_TTL_SECONDS, etag
+        )
+
+def _folder_cache_clear():
+    with _folder_cache_lock:
+        _folder_id_cache.clear()
+
+# Post-upload inventory rescans run off the request thread so the
+# upload response returns as soon as the PUT succeeds; the next
+# calendar read picks up the refreshed inventory
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='inv-refresh')
+
+def _log_refresh_result(account_id: str, future):
+    try:
+        refresh_result = future.result()
+    except Exception as e:
+        logger.warning("Inventory refresh crashed for %s: %s", account_id, e)
+        return
+    if refresh_result.get('success'):
+        logger.info("Refreshed inventory for %s - found %s files",
+                    account_id, refresh_result.get('files_found', 0))
+    else:
+        logger.warning("Failed to refresh inventory for %s: %s",
+                       account_id, refresh_result.get('error'))
+
+# Batch uploads (a user dragging a month's worth of statements) would
+# otherwise trigger one rescan per file; refreshes are coalesced per
+# account within a short window so a burst produces a single rescan
+_REFRESH_DELAY_SECONDS = 2.0
+_refresh_timer_lock = threading.Lock()
+_pending_refresh: Dict[str, threading.Timer] = {}
+
+def _schedule_refresh(scanner, account_id: str, access_token: str):
+    def _submit():
+        with _refresh_timer_lock:
+            _pending_refresh.pop(account_id, None)
+        future = _refresh_pool.submit(scanner.scan_single_account, account_id, access_token)
+        future.add_done_callback(functools.partial(_log_refresh_result, account_id))
+
+    with _refresh_timer_lock:
+        timer = _pending_refresh.get(account_id)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(_REFRESH_DELAY_SECONDS, _submit)
+        timer.daemon = True
+        _pending_refresh[account_id] = timer
+        timer.start()
+
+# Debounce window for performance-cache eviction after uploads
+_INVALIDATE_DELAY_SECONDS = 0.5
+_invalidate_lock = threading.Lock()
+_invalidate_timers: Dict[str, threading.Timer] = {}
+
+def _schedule_cache_invalidation(account_type: str):
+    """Debounce cache eviction so back-to-back uploads trigger one
+    rebuild instead of one per file"""
+    if unified_cache is None:
+        return
+    with _invalidate_lock:
+        timer = _invalidate_timers.get(account_type)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(_INVALIDATE_DELAY_SECONDS,
+                                unified_cache.invalidate_pattern,
+                                args=(account_type,))
+        timer.daemon = True
+        _invalidate_timers[account_type] = timer
+        timer.start()
+
+@functools.cache
+def _get_bbva_parser_cls():
+    """Resolve BBVAParser once per process; None when unavailable"""
+    try:
+        from modules.bbva.bbva_parser import BBVAParser
+        return BBVAParser
+    except ImportError:
+        return None
+
+@functools.cache
+def _get_pdfplumber():
+    """Resolve pdfplumber once per process; None when not installed"""
+    try:
+        import pdfplumber
+        return pdfplumber
+    except ImportError:
+        return None
+
+@functools.lru_cache(maxsize=1024)
+def _detect_file_type_cached(filename: str) -> Dict[str, Any]:
+    """Detect file type and extract metadata from a filename
+
+    Pure function of the filename, so results are memoized - frontend
+    live validation hits this with the same name repeatedly. Callers
+    must go through UnifiedUploadHandler._detect_file_type, which
+    copies file_info before handing it out.
+    """
+    _, sep, extension = filename.rpartition('.')
+    if not sep:
+        return {'success': False, 'error': 'File must have an extension'}
+    extension = extension.lower()
+
+    # Cheap extension reject before any regex work
+    if extension not in ('pdf', 'xlsx', 'xls'):
+        return {
+            'success': False,
+            'error': (
+                'Unsupported file format. Expected:\n'
+                '• STP: ec-[account]-YYYYMM.xlsx/pdf\n'
+                '• BBVA: Any PDF file for auto-detection'
+            )
+        }
+
+    # Constant-time length + prefix tests keep BBVA files (and anything
+    # else) out of the regex engine entirely; valid STP names are 32-33
+    # chars: 'ec-' + 18-digit account + '-' + YYYYMM + '.' + extension
+    if 32 <= len(filename) <= 33 and filename.startswith('ec-'):
+        stp_match = _STP_RE.fullmatch(filename)
+        if stp_match is None:
+            # STP-shaped name that fails validation (bad year/month) -
+            # report it rather than misrouting a .pdf to BBVA detection
+            return {
+                'success': False,
+                'error': 'Invalid STP filename. Expected: ec-[account]-YYYYMM.xlsx/pdf'
+            }
+    else:
+        stp_match = None
+
+    if stp_match:
+        account_number = stp_match.group(1)
+        year = stp_match.group(2)
+        month = stp_match.group(3)
+        file_ext = stp_match.group(4)
+        
+        account_id, account_config = get_account_by_identifier(account_number)
+        
+        if not account_config or account_config['type'] != 'stp':
+            return {'success': False, 'error': f'Unknown STP account number: {account_number}'}
+
+        return {
+            'success': True,
+            'file_info': {
+                'type': 'stp',
+                'account_id': account_id,
+                'account_number': account_number,
+                'account_name': account_config['name'],
+                'year': year,
+                'month': month,
+                'extension': file_ext,
+                'folder_name': account_config['folder_name'],
+                'expected_filename': filename
+            }
+        }
     
-    def __init__(self):
-        self.logger = logging.getLogger(__name__ + '.UnifiedUploadHandler')
+    # BBVA files: Any PDF for auto-detection
+    if extension == 'pdf':
+        return {
+            'success': True,
+            'file_info': {
+                'type': 'bbva',
+                'account_id': 'auto_detect',
+                'extension': 'pdf',
+                'auto_detected': True
+            }
+        }
     
+    return {
+        'success': False,
+        'error': (
+            'Unsupported file format. Expected:\n'
+            '• STP: ec-[account]-YYYYMM.xlsx/pdf\n'
+            '• BBVA: Any PDF file for auto-detection'
+        )
+    }
+
+class UnifiedUploadHandler:
+    """Clean upload handler with auto-detection and calendar updates"""
+
     def process_upload(self, file: FileStorage, access_token: str) -> Dict[str, Any]:
         """Process file upload with auto-detection"""
         
@@ -30,7 +338,7 @@ class UnifiedUploadHandler:
             return {'success': False, 'error': 'No file provided', 'filename': 'unknown'}
         
         filename = file.filename
-        self.logger.info(f"Processing upload: {filename}")
+        logger.info("Processing upload: %s", filename)
         
         # Step 1: Detect file type and validate
         detection_result = self._detect_file_type(filename)
@@ -43,7 +351,7 @@ class UnifiedUploadHandler:
             }
         
         file_info = detection_result['file_info']
-        self.logger.info(f"Detected {file_info['type']} file for account {file_info.get('account_id', 'auto_detect')}")
+        logger.info("Detected %s file for account %s", file_info['type'], file_info.get('account_id', 'auto_detect'))
         
         try:
             # Step 2: Route to appropriate upload handler
@@ -59,7 +367,7 @@ class UnifiedUploadHandler:
                 }
                 
         except Exception as e:
-            self.logger.error(f"Upload processing failed for {filename}: {e}")
+            logger.error("Upload processing failed for %s: %s", filename, e)
             return {
                 'success': False,
                 'error': f'Upload processing failed: {str(e)}',
@@ -68,85 +376,44 @@ class UnifiedUploadHandler:
     
     def _detect_file_type(self, filename: str) -> Dict[str, Any]:
         """Detect file type and extract metadata from filename"""
-        
-        if '.' not in filename:
-            return {'success': False, 'error': 'File must have an extension'}
-        
-        extension = filename.split('.')[-1].lower()
-        
-        # STP files: ec-[account]-YYYYMM.ext
-        stp_pattern = r'^ec-(\d{18})-(\d{4})(\d{2})\.(pdf|xlsx|xls)$'
-        stp_match = re.match(stp_pattern, filename)
-        
-        if stp_match:
-            account_number = stp_match.group(1)
-            year = stp_match.group(2)
-            month = stp_match.group(3)
-            file_ext = stp_match.group(4)
-            
-            account_id, account_config = get_account_by_identifier(account_number)
-            
-            if not account_config or account_config['type'] != 'stp':
-                return {'success': False, 'error': f'Unknown STP account number: {account_number}'}
-            
-            # Validate month
-            month_num = int(month)
-            if month_num < 1 or month_num > 12:
-                return {'success': False, 'error': f'Invalid month: {month}. Must be 01-12'}
-            
-            return {
-                'success': True,
-                'file_info': {
-                    'type': 'stp',
-                    'account_id': account_id,
-                    'account_number': account_number,
-                    'account_name': account_config['name'],
-                    'year': year,
-                    'month': month,
-                    'extension': file_ext,
-                    'folder_name': account_config['folder_name'],
-                    'expected_filename': filename
-                }
-            }
-        
-        # BBVA files: Any PDF for auto-detection
-        if extension == 'pdf':
-            return {
-                'success': True,
-                'file_info': {
-                    'type': 'bbva',
-                    'account_id': 'auto_detect',
-                    'extension': 'pdf',
-                    'auto_detected': True
-                }
-            }
-        
-        return {
-            'success': False,
-            'error': (
-                'Unsupported file format. Expected:\n'
-                '• STP: ec-[account]-YYYYMM.xlsx/pdf\n'
-                '• BBVA: Any PDF file for auto-detection'
-            )
-        }
-    
+        result = _detect_file_type_cached(filename)
+        file_info = result.get('file_info')
+        if file_info is not None:
+            # Hand each caller its own copy - the upload handlers
+            # mutate file_info in place and must not poison the cache
+            result = {'success': result['success'], 'file_info': dict(file_info)}
+        return result
+
     def _handle_stp_upload(self, file: FileStorage, file_info: Dict[str, Any], 
                           access_token: str) -> Dict[str, Any]:
         """Handle STP file upload using existing modules"""
         
         try:
-            from modules.stp.stp_files import upload_to_sharepoint
-            
-            file_content = file.read()
-            file.seek(0)
-            
-            if not file_content:
+            if upload_to_sharepoint is None:
+                return {
+                    'success': False,
+                    'error': 'STP upload module not available',
+                    'filename': file.filename
+                }
+
+            # Stream the upload from the request buffer instead of
+            # materializing a second in-memory copy of the whole file
+            stream = file.stream
+            head = stream.read(8)
+            stream.seek(0)
+            if not head:
                 return {'success': False, 'error': 'File is empty', 'filename': file.filename}
-            
+            if not _has_valid_magic(head, file_info['extension']):
+                return {
+                    'success': False,
+                    'error': f"File content does not look like a valid {file_info['extension'].upper()} file",
+                    'filename': file.filename
+                }
+
             # Upload to SharePoint
             success = upload_to_sharepoint(
                 filename=file_info['expected_filename'],
-                file_content=file_content,
+                file_content=stream,
                 target_folder=file_info['folder_name'],
                 access_token=access_token
             )
@@ -173,7 +440,7 @@ class UnifiedUploadHandler:
                 }
                 
         except Exception as e:
-            self.logger.error(f"STP upload error: {e}")
+            logger.error("STP upload error: %s", e)
             return {
                 'success': False,
                 'error': f'STP upload failed: {str(e)}',
@@ -187,8 +454,24 @@ class UnifiedUploadHandler:
         filename = file.filename
         
         try:
-            # Step 1: Auto-detect account from PDF content
-            if file_info.get('auto_detected'):
+            # Sniff the signature before any parsing or network work -
+            # catches empty and mislabeled files at µs cost
+            stream = file.stream
+            head = stream.read(8)
+            stream.seek(0)
+            if not head:
+                return {'success': False, 'error': 'File is empty', 'filename': filename}
+            if not _has_valid_magic(head, 'pdf'):
+                return {
+                    'success': False,
+                    'error': 'File content does not look like a valid PDF file',
+                    'filename': filename
+                }
+
+            # Step 1: Auto-detect account from PDF content, but only when
+            # the CLABE isn't already known - a pdfplumber parse costs
+            # hundreds of milliseconds on a multi-page statement
+            if file_info.get('auto_detected') and not file_info.get('clabe'):
                 detection_result = self._detect_bbva_from_content(file)
                 
                 if not detection_result['success']:
@@ -200,17 +483,11 @@ class UnifiedUploadHandler:
                 
                 file_info.update(detection_result['detected_info'])
             
-            # Step 2: Read file content
-            file_content = file.read()
-            file.seek(0)
-            
-            if not file_content:
-                return {'success': False, 'error': 'File is empty', 'filename': filename}
-            
-            # Step 3: Upload to SharePoint using navigation method
+            # Step 2: Upload the stream to SharePoint using navigation method
+            stream.seek(0)
             upload_result = self._upload_bbva_to_sharepoint(
                 filename=filename,
-                file_content=file_content,
+                file_content=stream,
                 folder_path=file_info['folder_path'],
                 access_token=access_token
             )
@@ -237,7 +514,7 @@ class UnifiedUploadHandler:
                 }
                 
         except Exception as e:
-            self.logger.error(f"BBVA upload error: {e}")
+            logger.error("BBVA upload error: %s", e)
             return {
                 'success': False,
                 'error': f'BBVA upload failed: {str(e)}',
@@ -247,76 +524,82 @@ class UnifiedUploadHandler:
     def _detect_bbva_from_content(self, file: FileStorage) -> Dict[str, Any]:
         """Auto-detect BBVA account from PDF content using existing BBVAParser"""
         
+        BBVAParser = _get_bbva_parser_cls()
+        pdfplumber = _get_pdfplumber()
+        if BBVAParser is None or pdfplumber is None:
+            return {
+                'success': False,
+                'error': 'BBVAParser not available - ensure pdfplumber is installed'
+            }
+
         try:
-            # Save to temp file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                file.save(temp_file.name)
-                temp_path = temp_file.name
-            
-            file.seek(0)
-            
-            try:
-                # Use existing BBVAParser
-                from modules.bbva.bbva_parser import BBVAParser
-                import pdfplumber
-                
-                parser = BBVAParser()
-                
-                # Extract PDF info
-                with pdfplumber.open(temp_path) as pdf:
+            parser = BBVAParser()
+
+            # pdfplumber accepts a file-like object, so parse the upload
+            # stream in place - no temp-file round trip through disk
+            stream = file.stream
+            stream.seek(0)
+            with pdfplumber.open(stream) as pdf:
+                # BBVA prints the CLABE in the first-page header, so a
+                # regex over that page's text is enough for most files
+                # and skips extracting text from every remaining page.
+                # Page 1 can also carry other 18-digit runs (counterpart
+                # CLABEs, references), so only a candidate that resolves
+                # to a configured BBVA account is trusted; anything else
+                # goes through the full parser.
+                clabe = None
+                if pdf.pages:
+                    first_text = pdf.pages[0].extract_text() or ''
+                    for candidate in _CLABE_RE.findall(first_text):
+                        _, candidate_config = get_account_by_identifier(candidate)
+                        if candidate_config and candidate_config['type'] == 'bbva':
+                            clabe = candidate
+                            break
+
+                if clabe is None:
                     pdf_info = parser._extract_pdf_info(pdf)
-                
-                clabe = pdf_info.get('clabe')
-                
-                if not clabe:
-                    return {
-                        'success': False,
-                        'error': 'Could not extract CLABE from PDF content'
-                    }
-                
-                # Find account by CLABE
-                account_id, account_config = get_account_by_identifier(clabe)
-                
-                if not account_config or account_config['type'] != 'bbva':
-                    return {
-                        'success': False,
-                        'error': f'CLABE {clabe} not found in BBVA configuration'
-                    }
-                
+                    clabe = pdf_info.get('clabe')
+            stream.seek(0)
+
+            if not clabe:
                 return {
-                    'success': True,
-                    'detected_info': {
-                        'account_id': account_id,
-                        'clabe': clabe,
-                        'account_name': account_config['name'],
-                        'folder_path': account_config['folder_path'],
-                        'auto_detected': True
-                    }
+                    'success': False,
+                    'error': 'Could not extract CLABE from PDF content'
                 }
-                
-            except ImportError:
+
+            # Find account by CLABE
+            account_id, account_config = get_account_by_identifier(clabe)
+
+            if not account_config or account_config['type'] != 'bbva':
                 return {
                     'success': False,
-                    'error': 'BBVAParser not available - ensure pdfplumber is installed'
+                    'error': f'CLABE {clabe} not found in BBVA configuration'
                 }
-                
+
+            return {
+                'success': True,
+                'detected_info': {
+                    'account_id': account_id,
+                    'clabe': clabe,
+                    'account_name': account_config['name'],
+                    'folder_path': account_config['folder_path'],
+                    'auto_detected': True
+                }
+            }
+
         except Exception as e:
             return {
                 'success': False,
                 'error': f'PDF analysis failed: {str(e)}'
             }
-            
-        finally:
-            # Clean up temporary file
-            try:
-                if 'temp_path' in locals():
-                    os.unlink(temp_path)
-            except:
-                pass
     
-    def _upload_bbva_to_sharepoint(self, filename: str, file_content: bytes, 
+    def _upload_bbva_to_sharepoint(self, filename: str, file_content,
                                   folder_path: str, access_token: str) -> Dict[str, Any]:
-        """Upload BBVA file using navigation method (same as bbva_files.py)"""
+        """Upload BBVA file using navigation method (same as bbva_files.py)
+
+        file_content may be bytes or a seekable file-like object;
+        requests streams the latter without buffering it in memory.
+        """
         
         try:
             headers = {'Authorization': f'Bearer {access_token}'}
@@ -326,28 +609,33 @@ class UnifiedUploadHandler:
             bancos_folder_id = "01YH7LZSZL4O2ZOMG4RVH2Y7NLUTM5M33V"
             
             # Navigate to target folder using same method as read system
-            estados_folder_id = self._get_estados_folder(bancos_folder_id, headers, drive_id)
-            if not estados_folder_id:
-                return {'success': False, 'error': 'Estados de Cuenta folder not found'}
-            
-            bbva_folder_id = self._get_bbva_folder(estados_folder_id, headers, drive_id)
-            if not bbva_folder_id:
-                return {'success': False, 'error': 'BBVA folder not found'}
-            
-            account_folder_id = self._get_account_folder(bbva_folder_id, folder_path, headers, drive_id)
+            account_folder_id = self._resolve_account_folder(bancos_folder_id, folder_path, headers, drive_id)
             if not account_folder_id:
                 return {'success': False, 'error': f'Account folder not found: {folder_path}'}
-            
+
             # Upload file using folder ID
             upload_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{account_folder_id}:/{filename}:/content"
-            
+
             upload_headers = {
                 'Authorization': f'Bearer {access_token}',
                 'Content-Type': 'application/pdf'
             }
-            
-            response = requests.put(upload_url, headers=upload_headers, data=file_content, timeout=30)
-            
+
+            response = _session.put(upload_url, headers=upload_headers, data=file_content, timeout=30)
+
+            if response.status_code == 404:
+                # Cached folder ID went stale (folder moved/renamed) -
+                # drop the cache, re-walk once and retry the upload
+                logger.warning("Cached folder ID stale for %s, re-resolving", folder_path)
+                _folder_cache_clear()
+                account_folder_id = self._resolve_account_folder(bancos_folder_id, folder_path, headers, drive_id)
+                if not account_folder_id:
+                    return {'success': False, 'error': f'Account folder not found: {folder_path}'}
+                if hasattr(file_content, 'seek'):
+                    file_content.seek(0)
+                upload_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{account_folder_id}:/{filename}:/content"
+                response = _session.put(upload_url, headers=upload_headers, data=file_content, timeout=30)
+
             if response.status_code in [200, 201]:
                 response_data = response.json()
                 return {
@@ -370,45 +658,109 @@ class UnifiedUploadHandler:
                 'error': f'Upload exception: {str(e)}'
             }
     
+    def _resolve_account_folder(self, bancos_folder_id: str, folder_path: str,
+                                headers: Dict, drive_id: str) -> Optional[str]:
+        """Resolve the target account folder ID
+
+        Graph resolves a whole relative path in one request via the
+        ':/path:' addressing syntax, so the common case costs a single
+        round-trip instead of one children listing per level. Falls
+        back to the per-level walk if the path lookup fails (e.g. a
+        parent folder was renamed away from its configured name).
+        """
+        cached_id, cached_etag, fresh = _folder_cache_peek(drive_id, bancos_folder_id, folder_path)
+        if fresh:
+            return cached_id
+
+        try:
+            url = (f"https://graph.microsoft.com/v1.0/drives/{drive_id}"
+                   f"/items/{bancos_folder_id}:/{quote(folder_path)}")
+            request_headers = headers
+            if cached_etag:
+                # Revalidate the expired entry instead of re-fetching -
+                # a 304 renews the lease with no body to parse
+                request_headers = dict(headers)
+                request_headers['If-None-Match'] = cached_etag
+            response = _session.get(url, headers=request_headers, timeout=_GRAPH_TIMEOUT)
+            if response.status_code == 304 and cached_id:
+                _folder_cache_put(drive_id, bancos_folder_id, folder_path, cached_id, cached_etag)
+                return cached_id
+            if response.status_code == 200:
+                item = response.json()
+                folder_id = item.get('id')
+                if folder_id:
+                    _folder_cache_put(drive_id, bancos_folder_id, folder_path,
+                                      folder_id, item.get('eTag'))
+                    return folder_id
+        except Exception as e:
+            logger.debug("Path-addressed folder lookup failed for %s: %s", folder_path, e)
+
+        return self._walk_account_folder(bancos_folder_id, folder_path, headers, drive_id)
+
+    def _walk_account_folder(self, bancos_folder_id: str, folder_path: str,
+                             headers: Dict, drive_id: str) -> Optional[str]:
+        """Walk Bancos -> Estados de Cuenta -> BBVA -> account folder"""
+        estados_folder_id = self._get_estados_folder(bancos_folder_id, headers, drive_id)
+        if not estados_folder_id:
+            return None
+
+        bbva_folder_id = self._get_bbva_folder(estados_folder_id, headers, drive_id)
+        if not bbva_folder_id:
+            return None
+
+        return self._get_account_folder(bbva_folder_id, folder_path, headers, drive_id)
+
     def _get_estados_folder(self, bancos_folder_id: str, headers: Dict, drive_id: str) -> Optional[str]:
         """Get Estados de Cuenta folder ID"""
+        cached = _folder_cache_get(drive_id, bancos_folder_id, '<estados>')
+        if cached:
+            return cached
         try:
-            url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{bancos_folder_id}/children"
-            response = requests.get(url, headers=headers)
-            
+            url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{bancos_folder_id}/children{_CHILDREN_SELECT}"
+            response = _session.get(url, headers=headers, timeout=_GRAPH_TIMEOUT)
+
             if response.status_code != 200:
                 return None
-            
-            items = response.json().get('value', [])
+
+            items = _parse_graph_json(response).get('value', ())
             estados_folder = next(
-                (item for item in items 
-                 if item.get('folder') and 'estado' in item.get('name', '').lower()), 
+                (item for item in items
+                 if item.get('folder') and 'estado' in item.get('name', '').lower()),
                 None
             )
-            
-            return estados_folder.get('id') if estados_folder else None
-            
+
+            if estados_folder:
+                _folder_cache_put(drive_id, bancos_folder_id, '<estados>', estados_folder['id'])
+                return estados_folder['id']
+            return None
+
         except Exception:
             return None
     
     def _get_bbva_folder(self, estados_folder_id: str, headers: Dict, drive_id: str) -> Optional[str]:
         """Get BBVA folder ID"""
+        cached = _folder_cache_get(drive_id, estados_folder_id, '<bbva>')
+        if cached:
+            return cached
         try:
-            url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{estados_folder_id}/children"
-            response = requests.get(url, headers=headers)
-            
+            url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{estados_folder_id}/children{_CHILDREN_SELECT}"
+            response = _session.get(url, headers=headers, timeout=_GRAPH_TIMEOUT)
+
             if response.status_code != 200:
                 return None
-            
-            items = response.json().get('value', [])
+
+            items = _parse_graph_json(response).get('value', ())
             bbva_folder = next(
-                (item for item in items 
-                 if item.get('folder') and 'bbva' in item.get('name', '').lower()), 
+                (item for item in items
+                 if item.get('folder') and 'bbva' in item.get('name', '').lower()),
                 None
             )
-            
-            return bbva_folder.get('id') if bbva_folder else None
-            
+
+            if bbva_folder:
+                _folder_cache_put(drive_id, estados_folder_id, '<bbva>', bbva_folder['id'])
+                return bbva_folder['id']
+            return None
+
         except Exception:
             return None
     
@@ -437,22 +789,28 @@ class UnifiedUploadHandler:
     
     def _find_subfolder(self, parent_folder_id: str, folder_name: str, headers: Dict, drive_id: str) -> Optional[str]:
         """Find specific subfolder"""
+        cached = _folder_cache_get(drive_id, parent_folder_id, folder_name)
+        if cached:
+            return cached
         try:
-            url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{parent_folder_id}/children"
-            response = requests.get(url, headers=headers)
-            
+            url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{parent_folder_id}/children{_CHILDREN_SELECT}"
+            response = _session.get(url, headers=headers, timeout=_GRAPH_TIMEOUT)
+
             if response.status_code != 200:
                 return None
-            
-            items = response.json().get('value', [])
+
+            items = _parse_graph_json(response).get('value', ())
             target_folder = next(
-                (item for item in items 
-                 if item.get('folder') and item.get('name') == folder_name), 
+                (item for item in items
+                 if item.get('folder') and item.get('name') == folder_name),
                 None
             )
-            
-            return target_folder.get('id') if target_folder else None
-            
+
+            if target_folder:
+                _folder_cache_put(drive_id, parent_folder_id, folder_name, target_folder['id'])
+                return target_folder['id']
+            return None
+
         except Exception:
             return None
     
@@ -460,58 +818,34 @@ class UnifiedUploadHandler:
         """FIXED: Clear cache and trigger inventory refresh after successful upload"""
         
         try:
-            # Step 1: Clear inventory manager cache
-            from .inventory_manager import InventoryManager
-            inventory_manager = InventoryManager()
-            inventory_manager.clear_cache()
-            self.logger.info("Cleared inventory manager cache after upload")
-            
-            # Step 2: Trigger immediate inventory refresh for this account
-            from .inventory_scanner import InventoryScanner
-            scanner = InventoryScanner()
-            
-            self.logger.info(f"Triggering inventory refresh for {account_id} after upload")
-            refresh_result = scanner.scan_single_account(account_id, access_token)
-            
-            if refresh_result.get('success'):
-                self.logger.info(f"Successfully refreshed inventory for {account_id} - found {refresh_result.get('files_found', 0)} files")
+            if _inventory_manager is None or _inventory_scanner is None:
+                logger.warning("Inventory modules unavailable; skipping refresh")
             else:
-                self.logger.warning(f"Failed to refresh inventory for {account_id}: {refresh_result.get('error')}")
-                
+                # Step 1: Clear inventory manager cache
+                _inventory_manager.clear_cache()
+                logger.info("Cleared inventory manager cache after upload")
+
+                # Step 2: Kick off the inventory refresh in the background -
+                # the upload response must not wait for a full account rescan
+                logger.info("Scheduling inventory refresh for %s after upload", account_id)
+                _schedule_refresh(_inventory_scanner, account_id, access_token)
+
         except Exception as e:
-            self.logger.warning(f"Could not refresh inventory after upload: {e}")
+            logger.warning("Could not refresh inventory after upload: %s", e)
         
-        # Keep existing cache clearing code as fallback
-        try:
-            from modules.shared.performance_cache import unified_cache
+        # Keep existing cache clearing code as fallback, but only evict
+        # entries for the affected account type - nuking the whole cache
+        # forced a cold rebuild of every account on the next dashboard load
+        account_type = UNIFIED_ACCOUNTS.get(account_id, {}).get('type')
+        if account_type:
+            # Debounced so bursts of uploads coalesce into one eviction
+            _schedule_cache_invalidation(account_type)
+            logger.info("Scheduled %s cache invalidation after upload", account_type)
+        elif unified_cache is not None:
             unified_cache.cache.clear()
-            self.logger.info("Cleared performance cache after upload")
-        except ImportError:
-            pass
+            logger.info("Cleared performance cache after upload")
         
-        try:
-            # Clear inventory cache files for this account (legacy fallback)
-            import glob
-            
-            cache_patterns = [
-                f"*{account_id}*inventory*.json",
-                f"*inventory*{account_id}*.json", 
-                f"*inventory*.json",  # Clear all inventory files
-            ]
-            
-            for pattern in cache_patterns:
-                files = glob.glob(pattern)
-                for file_path in files:
-                    try:
-                        os.remove(file_path)
-                        self.logger.info(f"Removed inventory cache: {file_path}")
-                    except:
-                        pass
-                        
-        except Exception as e:
-            self.logger.debug(f"Could not clear inventory files: {e}")
-        
-        self.logger.info(f"Cache cleared and inventory refreshed for account {account_id}")
+        logger.info("Cache cleared and inventory refreshed for account %s", account_id)
     
     def validate_file_format(self, filename: str) -> Dict[str, Any]:
         """Validate file format without processing upload"""
@@ -519,17 +853,6 @@ class UnifiedUploadHandler:
     
     def get_supported_formats(self) -> Dict[str, Any]:
         """Get information about supported file formats"""
-        return {
-            'stp': {
-                'pattern': 'ec-[account]-YYYYMM.xlsx/pdf',
-                'example': 'ec-646180559700000009-202501.xlsx',
-                'extensions': ['xlsx', 'pdf'],
-                'description': 'STP Excel statements and PDF exports'
-            },
-            'bbva': {
-                'pattern': 'Any PDF file for auto-detection',
-                'example': '2508 FSA BBVA MXN.pdf',
-                'extensions': ['pdf'],
-                'description': 'BBVA PDF bank statements with auto-detection support'
-            }
-        }
\ No newline at end of file
+        # Shallow copy so jsonify gets a plain dict; the nested metadata
+        # itself is shared and treated as read-only
+        return dict(_SUPPORTED_FORMATS)
\ No newline at end of file
@@ -3,27 +3,39 @@ STP (Sistema de Transferencias y Pagos) Module Package
 
 This package contains all STP-related functionality including:
 - Database operations (stp_database)
-- File parsing (stp_parser) 
+- File parsing (stp_parser)
 - File management (stp_files)
 - Analytics and reporting (stp_analytics)
 - Helper utilities (stp_helpers)
 """
 
-# Import key functions for easier access
-try:
-    from .stp_database import get_json_database, update_json_database
-    from .stp_parser import parse_excel_file
-    from .stp_files import get_stp_files, create_stp_calendar_data
-    from .stp_analytics import get_monthly_record_counts
-    from .stp_helpers import get_account_type, validate_account_number
-except ImportError:
-    # Graceful handling if some modules aren't available yet
-    pass
+# Re-exported names resolve lazily (PEP 562): importing modules.stp no
+# longer pays for every submodule up front, and a genuinely broken
+# submodule raises at first use instead of being swallowed by the old
+# catch-all ImportError.
+_LAZY_EXPORTS = {
+    'get_json_database': '.stp_database',
+    'update_json_database': '.stp_database',
+    'parse_excel_file': '.stp_parser',
+    'get_stp_files': '.stp_files',
+    'create_stp_calendar_data': '.stp_files',
+    'get_monthly_record_counts': '.stp_analytics',
+    'get_account_type': '.stp_helpers',
+    'validate_account_number': '.stp_helpers',
+}
 
-__all__ = [
-    'get_json_database', 'update_json_database',
-    'parse_excel_file',
-    'get_stp_files', 'create_stp_calendar_data', 
-    'get_monthly_record_counts',
-    'get_account_type', 'validate_account_number'
-]
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
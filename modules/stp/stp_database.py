@@ -4,27 +4,110 @@ STP Database Management Module
 Handles all database operations for STP file tracking and JSON database management.
 """
 
+import hashlib
 import logging
 import json
+import threading
+import time
 import requests
 from datetime import datetime
 from typing import Dict, Any, Optional, List
+from urllib.parse import quote
+
+# orjson encodes large transaction databases roughly an order of
+# magnitude faster than stdlib json and returns bytes directly
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# One pooled session for all Graph calls in this module - folder walks,
+# database downloads and uploads reuse a kept-alive TLS connection
+# instead of handshaking per request
+_session = requests.Session()
+
+
+def _loads_response(response) -> Dict[str, Any]:
+    """Decode a JSON response body, preferring orjson
+
+    orjson.loads works on the raw bytes, skipping the text decode that
+    response.text performs on multi-MB database payloads.
+    """
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return json.loads(response.text)
+
+# The STP DB folder location never moves within a session, yet every
+# database/tracking operation re-ran the 3-call folder walk. Results
+# are cached per access token (hashed so the raw token isn't held) for
+# slightly less than the default AAD token lifetime.
+_NAV_CACHE_TTL_SECONDS = 3000
+_nav_cache_lock = threading.Lock()
+_nav_cache: Dict[str, tuple] = {}
+
+
+def _navigate_cached(access_token: str) -> Dict[str, str]:
+    """navigate_to_stp_db_folder with a per-token TTL cache"""
+    key = hashlib.blake2b(access_token.encode(), digest_size=16).hexdigest()
+
+    with _nav_cache_lock:
+        entry = _nav_cache.get(key)
+        if entry is not None and time.time() - entry[0] < _NAV_CACHE_TTL_SECONDS:
+            return entry[1]
+
+    stp_db_info = navigate_to_stp_db_folder(access_token)
+
+    with _nav_cache_lock:
+        _nav_cache[key] = (time.time(), stp_db_info)
+
+    return stp_db_info
+
 
 def navigate_to_stp_db_folder(access_token: str) -> Dict[str, str]:
-    """Navigate to STP DB folder and return folder ID"""
+    """Navigate to STP DB folder and return folder ID
+
+    Graph resolves the whole relative path in one ':/path:' request,
+    so the common case is a single round-trip instead of three
+    children listings. The per-level walk remains as a fallback for
+    when a folder was renamed away from its canonical name.
+    """
+    headers = {'Authorization': f'Bearer {access_token}'}
+    drive_id = "b!q3bruib_D0WIZS7yprZMBAUi_U53mb1KkFHHY5SmVTuIet9KaCuESqLv_QwsGcVu"
+    bancos_folder_id = "01YH7LZSZL4O2ZOMG4RVH2Y7NLUTM5M33V"
+
+    try:
+        path_url = (f"https://graph.microsoft.com/v1.0/drives/{drive_id}"
+                    f"/items/{bancos_folder_id}:/{quote('Estados de Cuenta/STP/STP DB')}")
+        response = _session.get(path_url, headers=headers)
+        if response.status_code == 200:
+            item = response.json()
+            if item.get('id'):
+                return {
+                    'drive_id': drive_id,
+                    'folder_id': item['id'],
+                    'folder_name': item.get('name')
+                }
+        logger.info(f"Path-addressed STP DB lookup returned {response.status_code}, falling back to folder walk")
+    except Exception as e:
+        logger.warning(f"Path-addressed STP DB lookup failed, falling back to folder walk: {e}")
+
+    return _walk_to_stp_db_folder(access_token)
+
+
+def _walk_to_stp_db_folder(access_token: str) -> Dict[str, str]:
+    """Locate the STP DB folder by walking one children listing per level"""
     try:
         headers = {'Authorization': f'Bearer {access_token}'}
         drive_id = "b!q3bruib_D0WIZS7yprZMBAUi_U53mb1KkFHHY5SmVTuIet9KaCuESqLv_QwsGcVu"
-        
+
         # Navigate: 04 Bancos → Estados de Cuenta → STP → STP DB
         bancos_folder_id = "01YH7LZSZL4O2ZOMG4RVH2Y7NLUTM5M33V"
-        
+
         # Get Estados de Cuenta folder
         bancos_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{bancos_folder_id}/children"
-        bancos_response = requests.get(bancos_url, headers=headers)
+        bancos_response = _session.get(bancos_url, headers=headers)
         
         if bancos_response.status_code != 200:
             raise Exception(f"Failed to access Bancos folder: {bancos_response.status_code}")
@@ -38,7 +121,7 @@ def navigate_to_stp_db_folder(access_token: str) -> Dict[str, str]:
         # Get STP folder
         estados_id = estados_folder.get('id')
         estados_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{estados_id}/children"
-        estados_response = requests.get(estados_url, headers=headers)
+        estados_response = _session.get(estados_url, headers=headers)
         
         if estados_response.status_code != 200:
             raise Exception(f"Failed to access Estados folder: {estados_response.status_code}")
@@ -52,7 +135,7 @@ def navigate_to_stp_db_folder(access_token: str) -> Dict[str, str]:
         # Get STP DB folder
         stp_id = stp_folder.get('id')
         stp_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{stp_id}/children"
-        stp_response = requests.get(stp_url, headers=headers)
+        stp_response = _session.get(stp_url, headers=headers)
         
         if stp_response.status_code != 200:
             raise Exception(f"Failed to access STP folder: {stp_response.status_code}")
@@ -77,7 +160,7 @@ def navigate_to_stp_db_folder(access_token: str) -> Dict[str, str]:
 def get_parse_tracking_data(access_token: str) -> Dict[str, Any]:
     """Load parsing tracking metadata"""
     try:
-        stp_db_info = navigate_to_stp_db_folder(access_token)
+        stp_db_info = _navigate_cached(access_token)
         drive_id = stp_db_info['drive_id']
         folder_id = stp_db_info['folder_id']
         
@@ -85,12 +168,12 @@ def get_parse_tracking_data(access_token: str) -> Dict[str, Any]:
         
         # Try to get tracking file
         tracking_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{folder_id}:/STP_Parse_Tracking.json:/content"
-        response = requests.get(tracking_url, headers=headers)
+        response = _session.get(tracking_url, headers=headers)
         
         if response.status_code == 200:
             try:
-                return json.loads(response.text)
-            except json.JSONDecodeError:
+                return _loads_response(response)
+            except ValueError:
                 logger.warning("Tracking file corrupted, recreating")
                 return {}
         elif response.status_code == 404:
@@ -108,7 +191,7 @@ def get_parse_tracking_data(access_token: str) -> Dict[str, Any]:
 def update_parse_tracking_data(tracking_data: Dict[str, Any], access_token: str) -> bool:
     """Save parsing tracking metadata"""
     try:
-        stp_db_info = navigate_to_stp_db_folder(access_token)
+        stp_db_info = _navigate_cached(access_token)
         drive_id = stp_db_info['drive_id']
         folder_id = stp_db_info['folder_id']
         
@@ -117,11 +200,17 @@ def update_parse_tracking_data(tracking_data: Dict[str, Any], access_token: str)
             'Content-Type': 'application/json'
         }
         
-        # Upload tracking file
+        # Upload tracking file - compact encoding; the file is only
+        # ever read back by this module
         tracking_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{folder_id}:/STP_Parse_Tracking.json:/content"
-        tracking_json = json.dumps(tracking_data, indent=2)
-        
-        response = requests.put(tracking_url, headers=headers, data=tracking_json.encode('utf-8'))
+        if orjson is not None:
+            tracking_payload = orjson.dumps(tracking_data)
+        else:
+            tracking_payload = json.dumps(
+                tracking_data, ensure_ascii=False, separators=(',', ':')
+            ).encode('utf-8')
+
+        response = _session.put(tracking_url, headers=headers, data=tracking_payload)
         
         if response.status_code not in [200, 201]:
             raise Exception(f"Failed to save tracking data: {response.status_code}")
@@ -134,10 +223,53 @@ def update_parse_tracking_data(tracking_data: Dict[str, Any], access_token: str)
         return False
 
 
+# Short-lived read cache so one request handler that touches the same
+# account database several times (counts + analytics) downloads the
+# multi-MB blob once. Entries are dropped when the database is saved.
+_DB_CACHE_TTL_SECONDS = 30
+_db_cache_lock = threading.Lock()
+_db_cache: Dict[tuple, tuple] = {}
+
+
+def get_json_database_cached(account_number: str, access_token: str) -> Dict[str, Any]:
+    """get_json_database behind a short per-token TTL cache
+
+    The returned dict is shared between callers - treat it as
+    read-only. Mutating flows must use get_json_database directly.
+    """
+    token_key = hashlib.blake2b(access_token.encode(), digest_size=16).hexdigest()
+    cache_key = (account_number, token_key)
+
+    with _db_cache_lock:
+        entry = _db_cache.get(cache_key)
+        if entry is not None and time.time() - entry[0] < _DB_CACHE_TTL_SECONDS:
+            return entry[1]
+
+    database = get_json_database(account_number, access_token)
+
+    with _db_cache_lock:
+        # Prune expired entries while holding the lock anyway - keys
+        # include the token hash, so without this a token rotation
+        # would strand the old token's multi-MB dicts forever
+        now = time.time()
+        for stale_key in [k for k, v in _db_cache.items()
+                          if now - v[0] >= _DB_CACHE_TTL_SECONDS]:
+            del _db_cache[stale_key]
+        _db_cache[cache_key] = (now, database)
+
+    return database
+
+
+def _invalidate_db_cache(account_number: str):
+    with _db_cache_lock:
+        for cache_key in [k for k in _db_cache if k[0] == account_number]:
+            del _db_cache[cache_key]
+
+
 def get_json_database(account_number: str, access_token: str) -> Dict[str, Any]:
     """Load JSON database for account"""
     try:
-        stp_db_info = navigate_to_stp_db_folder(access_token)
+        stp_db_info = _navigate_cached(access_token)
         drive_id = stp_db_info['drive_id']
         folder_id = stp_db_info['folder_id']
         
@@ -148,12 +280,12 @@ def get_json_database(account_number: str, access_token: str) -> Dict[str, Any]:
         
         # Try to get database file
         db_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{folder_id}:/{db_filename}:/content"
-        response = requests.get(db_url, headers=headers)
+        response = _session.get(db_url, headers=headers)
         
         if response.status_code == 200:
             try:
-                return json.loads(response.text)
-            except json.JSONDecodeError:
+                return _loads_response(response)
+            except ValueError:
                 logger.warning(f"Database file {db_filename} corrupted, recreating")
                 return create_empty_database(account_number)
         elif response.status_code == 404:
@@ -198,33 +330,53 @@ def get_database_filename(account_number: str) -> str:
     return filename_mapping.get(account_number, f'STP_{account_number}_DB.json')
 
 
-def update_json_database(account_number: str, data: Dict[str, Any], access_token: str) -> bool:
-    """Save JSON database for account"""
+def update_json_database(account_number: str, data, access_token: str) -> bool:
+    """Save JSON database for account
+
+    Args:
+        account_number: STP account number
+        data: Database dict, or the already-encoded JSON bytes for
+            callers that pre-serialize (metadata must then be current)
+        access_token: OAuth access token
+    """
     try:
-        stp_db_info = navigate_to_stp_db_folder(access_token)
+        stp_db_info = _navigate_cached(access_token)
         drive_id = stp_db_info['drive_id']
         folder_id = stp_db_info['folder_id']
-        
+
         db_filename = get_database_filename(account_number)
-        
+
         headers = {
             'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/json'
         }
-        
-        # Update metadata
-        data['metadata']['last_updated'] = datetime.now().isoformat()
-        data['metadata']['total_transactions'] = len(data['transactions'])
-        
+
+        if isinstance(data, (bytes, bytearray)):
+            # Caller pre-encoded the database; upload as-is
+            db_payload = data
+        else:
+            # Update metadata
+            data['metadata']['last_updated'] = datetime.now().isoformat()
+            data['metadata']['total_transactions'] = len(data['transactions'])
+
+            # orjson produces bytes directly, skipping the str build +
+            # encode copy of the whole database. Compact encoding -
+            # indentation inflated the machine-consumed payload ~30%
+            if orjson is not None:
+                db_payload = orjson.dumps(data)
+            else:
+                db_payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
         # Upload database file
         db_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{folder_id}:/{db_filename}:/content"
-        db_json = json.dumps(data, indent=2, ensure_ascii=False)
-        
-        response = requests.put(db_url, headers=headers, data=db_json.encode('utf-8'))
+        response = _session.put(db_url, headers=headers, data=db_payload)
         
         if response.status_code not in [200, 201]:
             raise Exception(f"Failed to save database: {response.status_code}")
-        
+
+        # Cached reads are stale now
+        _invalidate_db_cache(account_number)
+
         logger.info(f"Database {db_filename} updated successfully")
         return True
         
@@ -255,38 +407,36 @@ def cleanup_orphaned_transactions(database: Dict[str, Any], existing_filenames:
     """
     try:
         original_count = len(database['transactions'])
-        
-        # Get list of files currently referenced in database
-        db_files = set()
+
+        # Single pass: split transactions into kept vs orphaned while
+        # collecting which files went missing - the old version scanned
+        # the full list once to build the file set and again to filter
+        existing_files_set = frozenset(existing_filenames)
+        kept_transactions = []
+        orphaned_files = set()
+
         for transaction in database['transactions']:
             filename = transaction.get('file')
-            if filename:
-                db_files.add(filename)
-        
-        # Find files that are in database but no longer exist in SharePoint
-        existing_files_set = set(existing_filenames)
-        orphaned_files = db_files - existing_files_set
-        
+            if filename and filename not in existing_files_set:
+                orphaned_files.add(filename)
+            else:
+                kept_transactions.append(transaction)
+
         if orphaned_files:
             logger.info(f"Found {len(orphaned_files)} orphaned files in database for account {account_number}")
             logger.info(f"Orphaned files: {list(orphaned_files)}")
-            
-            # Remove transactions from orphaned files
-            database['transactions'] = [
-                t for t in database['transactions'] 
-                if t.get('file') not in orphaned_files
-            ]
-            
-            removed_count = original_count - len(database['transactions'])
+
+            database['transactions'] = kept_transactions
+            removed_count = original_count - len(kept_transactions)
             logger.info(f"Cleaned up {removed_count} orphaned transactions from {len(orphaned_files)} deleted files")
-            
+
             # Update metadata
             database['metadata']['last_cleanup'] = datetime.now().isoformat()
             database['metadata']['orphaned_files_removed'] = list(orphaned_files)
-            
+
         else:
             logger.info(f"No orphaned transactions found for account {account_number}")
-        
+
         return database
         
     except Exception as e:
@@ -6,79 +6,192 @@ Handles file operations, SharePoint navigation, and file content retrieval.
 
 import logging
 import re
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from typing import List, Dict, Any, Optional
+from urllib.parse import quote
+from urllib3.util.retry import Retry
 from modules.stp.stp_helpers import get_account_type, get_file_type, format_file_size, format_datetime, get_month_name
 
 logger = logging.getLogger(__name__)
 
+# One pooled session for all Graph traffic: keep-alive amortizes the
+# TLS handshake across calls, and transient 429/5xx responses retry
+# with backoff instead of failing the request.
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=['GET', 'PUT'],
+    ),
+))
+
+# @microsoft.graph.downloadUrl points at blob storage, not
+# graph.microsoft.com - a separate session keeps its pool from evicting
+# the Graph connections
+_download_session = requests.Session()
+
+_DRIVE_ID = "b!q3bruib_D0WIZS7yprZMBAUi_U53mb1KkFHHY5SmVTuIet9KaCuESqLv_QwsGcVu"
+_BANCOS_FOLDER_ID = "01YH7LZSZL4O2ZOMG4RVH2Y7NLUTM5M33V"
+
+# Compiled per-account filename patterns, built once on first use
+_FILENAME_RE_CACHE: Dict[str, re.Pattern] = {}
+
+
+def _get_file_re(account_number: str) -> re.Pattern:
+    """Compiled filename pattern for one account, built once per account"""
+    pattern = _FILENAME_RE_CACHE.get(account_number)
+    if pattern is None:
+        pattern = re.compile(rf"ec-{account_number}-(\d{{4}})(\d{{2}})\.(.+)$")
+        _FILENAME_RE_CACHE[account_number] = pattern
+    return pattern
+
+
+# The account folders under Estados de Cuenta/STP essentially never
+# move, so a resolved ID stays good for a long lease. On a warm cache
+# get_stp_files costs one GET (the files listing) instead of two, and
+# create_stp_calendar_data's three accounts share the two cached IDs.
+_FOLDER_TTL_SECONDS = 3600
+_folder_id_lock = threading.Lock()
+_folder_id_cache: Dict[str, tuple] = {}  # folder_name -> (folder_id, expires_at)
+
+
+def _folder_cache_get(folder_name: str) -> Optional[str]:
+    with _folder_id_lock:
+        entry = _folder_id_cache.get(folder_name)
+        if entry is None:
+            return None
+        folder_id, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del _folder_id_cache[folder_name]
+            return None
+        return folder_id
+
+
+def _folder_cache_put(folder_name: str, folder_id: str) -> None:
+    with _folder_id_lock:
+        _folder_id_cache[folder_name] = (folder_id, time.monotonic() + _FOLDER_TTL_SECONDS)
+
+
+def _folder_cache_clear() -> None:
+    with _folder_id_lock:
+        _folder_id_cache.clear()
+
+
+def _resolve_stp_folder(folder_name: str, headers: Dict[str, str]) -> Optional[str]:
+    """Resolve Estados de Cuenta/STP/<folder_name> to its item ID
+
+    Graph's ':/path:' addressing resolves the whole relative path in one
+    request, replacing the three sequential children listings. Falls
+    back to the per-level walk if the path lookup fails (e.g. a parent
+    folder was renamed). Resolved IDs are cached for
+    _FOLDER_TTL_SECONDS, so warm calls skip the lookup entirely.
+    """
+    cached_id = _folder_cache_get(folder_name)
+    if cached_id is not None:
+        return cached_id
+
+    try:
+        path = f"Estados de Cuenta/STP/{folder_name}"
+        path_url = (f"https://graph.microsoft.com/v1.0/drives/{_DRIVE_ID}"
+                    f"/items/{_BANCOS_FOLDER_ID}:/{quote(path)}")
+        response = _session.get(path_url, headers=headers)
+        if response.status_code == 200:
+            item_id = response.json().get('id')
+            if item_id:
+                _folder_cache_put(folder_name, item_id)
+                return item_id
+        logger.info(f"Path-addressed lookup of '{folder_name}' returned {response.status_code}, falling back to folder walk")
+    except Exception as e:
+        logger.warning(f"Path-addressed lookup of '{folder_name}' failed, falling back to folder walk: {e}")
+
+    folder_id = _walk_stp_folder(folder_name, headers)
+    if folder_id:
+        _folder_cache_put(folder_name, folder_id)
+    return folder_id
+
+
+def _walk_stp_folder(folder_name: str, headers: Dict[str, str]) -> Optional[str]:
+    """Locate Estados de Cuenta/STP/<folder_name> one children listing at a time"""
+    # Navigate: 04 Bancos → Estados de Cuenta → STP → [folder_name]
+    bancos_url = f"https://graph.microsoft.com/v1.0/drives/{_DRIVE_ID}/items/{_BANCOS_FOLDER_ID}/children"
+    bancos_response = _session.get(bancos_url, headers=headers)
+
+    if bancos_response.status_code != 200:
+        logger.error(f"Failed to access Bancos folder: {bancos_response.status_code}")
+        return None
+
+    bancos_items = bancos_response.json().get('value', [])
+    estados_folder = next((item for item in bancos_items if item.get('folder') and 'estado' in item.get('name', '').lower()), None)
+
+    if not estados_folder:
+        logger.error("Estados de Cuenta folder not found")
+        return None
+
+    estados_id = estados_folder.get('id')
+    estados_url = f"https://graph.microsoft.com/v1.0/drives/{_DRIVE_ID}/items/{estados_id}/children"
+    estados_response = _session.get(estados_url, headers=headers)
+
+    if estados_response.status_code != 200:
+        logger.error(f"Failed to access Estados folder: {estados_response.status_code}")
+        return None
+
+    estados_items = estados_response.json().get('value', [])
+    stp_folder = next((item for item in estados_items if item.get('folder') and 'stp' in item.get('name', '').lower()), None)
+
+    if not stp_folder:
+        logger.error("STP folder not found")
+        return None
+
+    stp_id = stp_folder.get('id')
+    stp_url = f"https://graph.microsoft.com/v1.0/drives/{_DRIVE_ID}/items/{stp_id}/children"
+    stp_response = _session.get(stp_url, headers=headers)
+
+    if stp_response.status_code != 200:
+        logger.error(f"Failed to access STP folder: {stp_response.status_code}")
+        return None
+
+    stp_items = stp_response.json().get('value', [])
+    target_folder = next((item for item in stp_items if item.get('folder') and item.get('name') == folder_name), None)
+
+    if not target_folder:
+        logger.error(f"Target folder '{folder_name}' not found")
+        return None
+
+    return target_folder.get('id')
+
 
 def get_stp_files(account_number: str, access_token: str, year: Optional[int] = None, month: Optional[int] = None) -> List[Dict[str, Any]]:
     """Get STP files using Graph API navigation"""
     
     try:
         headers = {'Authorization': f'Bearer {access_token}'}
-        drive_id = "b!q3bruib_D0WIZS7yprZMBAUi_U53mb1KkFHHY5SmVTuIet9KaCuESqLv_QwsGcVu"
-        bancos_folder_id = "01YH7LZSZL4O2ZOMG4RVH2Y7NLUTM5M33V"
-        
-        # Navigate through folder hierarchy
-        # 04 Bancos → Estados de Cuenta → STP → [Account Folder]
-        
-        # Get Estados de Cuenta folder
-        bancos_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{bancos_folder_id}/children"
-        bancos_response = requests.get(bancos_url, headers=headers)
-        
-        if bancos_response.status_code != 200:
-            return []
-        
-        bancos_items = bancos_response.json().get('value', [])
-        estados_folder = next((item for item in bancos_items if item.get('folder') and 'estado' in item.get('name', '').lower()), None)
-        
-        if not estados_folder:
-            return []
-        
-        # Get STP folder
-        estados_id = estados_folder.get('id')
-        estados_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{estados_id}/children"
-        estados_response = requests.get(estados_url, headers=headers)
-        
-        if estados_response.status_code != 200:
-            return []
-        
-        estados_items = estados_response.json().get('value', [])
-        stp_folder = next((item for item in estados_items if item.get('folder') and 'stp' in item.get('name', '').lower()), None)
-        
-        if not stp_folder:
-            return []
-        
-        # Get account-specific folder
+        drive_id = _DRIVE_ID
+
+        # Account-specific folder under Estados de Cuenta/STP
         account_folder_map = {
             '646180559700000009': 'STP SA New',
             '646180403000000004': 'STP IP',
             '646990403000000003': 'STP IP'
         }
-        
+
         target_folder_name = account_folder_map.get(account_number)
         if not target_folder_name:
             return []
-        
-        stp_id = stp_folder.get('id')
-        stp_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{stp_id}/children"
-        stp_response = requests.get(stp_url, headers=headers)
-        
-        if stp_response.status_code != 200:
-            return []
-        
-        stp_items = stp_response.json().get('value', [])
-        account_folder = next((item for item in stp_items if item.get('folder') and item.get('name') == target_folder_name), None)
-        
-        if not account_folder:
+
+        account_id = _resolve_stp_folder(target_folder_name, headers)
+        if not account_id:
             return []
-        
+
         # Get files from account folder
-        account_id = account_folder.get('id')
         files_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{account_id}/children"
-        files_response = requests.get(files_url, headers=headers)
+        files_response = _session.get(files_url, headers=headers)
         
         if files_response.status_code != 200:
             return []
@@ -87,14 +200,14 @@ def get_stp_files(account_number: str, access_token: str, year: Optional[int] =
         
         # Filter and process STP files
         stp_files = []
-        pattern = rf"ec-{account_number}-(\d{{4}})(\d{{2}})\.(.+)$"
-        
+        pattern = _get_file_re(account_number)
+
         for file in files:
             if file.get('folder'):
                 continue
-                
+
             filename = file.get('name', '')
-            match = re.match(pattern, filename)
+            match = pattern.match(filename)
             
             if match:
                 file_year = match.group(1)
@@ -150,10 +263,20 @@ def create_stp_calendar_data(access_token: str, year: int = 2025) -> Dict[str, A
     ])
      
     calendar_data = OrderedDict()  # Use OrderedDict to preserve order
-    
+
+    # The three per-account listings are independent network calls, so
+    # fetch them concurrently; results are consumed in accounts order
+    # below, which keeps the tab ordering intact
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+        futures = {
+            account_number: executor.submit(get_stp_files, account_number, access_token, year=year)
+            for account_number in accounts
+        }
+
     for account_number, account_type in accounts.items():
-        files = get_stp_files(account_number, access_token, year=year)
-        
+        files = futures[account_number].result()
+
         # Organize by month
         months_data = {}
         for month in range(1, 13):
@@ -197,7 +320,7 @@ def get_file_content_by_ids(drive_id: str, file_id: str, access_token: str) -> O
         
         # Get download URL
         file_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{file_id}"
-        response = requests.get(file_url, headers=headers)
+        response = _session.get(file_url, headers=headers)
         
         if response.status_code != 200:
             logger.error(f"Failed to get file info: {response.status_code}")
@@ -211,7 +334,7 @@ def get_file_content_by_ids(drive_id: str, file_id: str, access_token: str) -> O
             return None
         
         # Download file content
-        download_response = requests.get(download_url, timeout=60)
+        download_response = _download_session.get(download_url, timeout=60)
         download_response.raise_for_status()
         
         return download_response.content
@@ -221,76 +344,44 @@ def get_file_content_by_ids(drive_id: str, file_id: str, access_token: str) -> O
         return None
 
 
-def upload_to_sharepoint(filename: str, file_content: bytes, target_folder: str, access_token: str) -> bool:
-    """Upload file to specific SharePoint folder"""
+def upload_to_sharepoint(filename: str, file_content, target_folder: str, access_token: str) -> bool:
+    """Upload file to specific SharePoint folder
+
+    file_content may be bytes or a seekable file-like object; requests
+    streams the latter without buffering it in memory.
+    """
     try:
-        headers = {'Authorization': f'Bearer {access_token}'}
-        
-        # Your SharePoint structure
-        drive_id = "b!q3bruib_D0WIZS7yprZMBAUi_U53mb1KkFHHY5SmVTuIet9KaCuESqLv_QwsGcVu"
-        bancos_folder_id = "01YH7LZSZL4O2ZOMG4RVH2Y7NLUTM5M33V"
-        
-        # Navigate to target folder (same logic as get_stp_files)
+        # Navigate to target folder (same hierarchy as get_stp_files)
         # 04 Bancos → Estados de Cuenta → STP → [target_folder]
-        
-        # Get Estados de Cuenta folder
-        bancos_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{bancos_folder_id}/children"
-        bancos_response = requests.get(bancos_url, headers=headers)
-        
-        if bancos_response.status_code != 200:
-            logger.error(f"Failed to access Bancos folder: {bancos_response.status_code}")
-            return False
-        
-        bancos_items = bancos_response.json().get('value', [])
-        estados_folder = next((item for item in bancos_items if item.get('folder') and 'estado' in item.get('name', '').lower()), None)
-        
-        if not estados_folder:
-            logger.error("Estados de Cuenta folder not found")
-            return False
-        
-        # Get STP folder
-        estados_id = estados_folder.get('id')
-        estados_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{estados_id}/children"
-        estados_response = requests.get(estados_url, headers=headers)
-        
-        if estados_response.status_code != 200:
-            logger.error(f"Failed to access Estados folder: {estados_response.status_code}")
-            return False
-        
-        estados_items = estados_response.json().get('value', [])
-        stp_folder = next((item for item in estados_items if item.get('folder') and 'stp' in item.get('name', '').lower()), None)
-        
-        if not stp_folder:
-            logger.error("STP folder not found")
-            return False
-        
-        # Get target account folder
-        stp_id = stp_folder.get('id')
-        stp_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{stp_id}/children"
-        stp_response = requests.get(stp_url, headers=headers)
-        
-        if stp_response.status_code != 200:
-            logger.error(f"Failed to access STP folder: {stp_response.status_code}")
-            return False
-        
-        stp_items = stp_response.json().get('value', [])
-        target_account_folder = next((item for item in stp_items if item.get('folder') and item.get('name') == target_folder), None)
-        
-        if not target_account_folder:
-            logger.error(f"Target folder '{target_folder}' not found")
+        headers = {'Authorization': f'Bearer {access_token}'}
+        target_folder_id = _resolve_stp_folder(target_folder, headers)
+
+        if not target_folder_id:
             return False
-        
+
         # Upload file to target folder
-        target_folder_id = target_account_folder.get('id')
-        upload_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{target_folder_id}:/{filename}:/content"
+        upload_url = f"https://graph.microsoft.com/v1.0/drives/{_DRIVE_ID}/items/{target_folder_id}:/{filename}:/content"
         
         upload_headers = {
             'Authorization': f'Bearer {access_token}',
             'Content-Type': 'application/octet-stream'
         }
         
-        upload_response = requests.put(upload_url, headers=upload_headers, data=file_content)
-        
+        upload_response = _session.put(upload_url, headers=upload_headers, data=file_content)
+
+        if upload_response.status_code == 404:
+            # Cached folder ID may be stale (folder recreated) - drop the
+            # cache, re-resolve and retry once
+            logger.warning(f"Upload target folder ID stale for '{target_folder}', re-resolving")
+            _folder_cache_clear()
+            target_folder_id = _resolve_stp_folder(target_folder, headers)
+            if not target_folder_id:
+                return False
+            if hasattr(file_content, 'seek'):
+                file_content.seek(0)
+            upload_url = f"https://graph.microsoft.com/v1.0/drives/{_DRIVE_ID}/items/{target_folder_id}:/{filename}:/content"
+            upload_response = _session.put(upload_url, headers=upload_headers, data=file_content)
+
         if upload_response.status_code in [200, 201]:
             logger.info(f"File {filename} uploaded successfully to {target_folder}")
             return True
@@ -5,9 +5,16 @@ Utility functions for formatting, validation, and common operations.
 """
 
 import math
+import re
 from datetime import datetime
 from typing import Optional
 
+# Compiled once at import; these run on every filename passing through
+# validation/sanitization
+_VALID_RE = re.compile(r'^ec-(\d{18})-(\d{4})(\d{2})\.(pdf|xlsx|xls)$', re.IGNORECASE)
+_SANITIZE_RE = re.compile(r'[<>:"/\\|?*]')
+_YM_RE = re.compile(r'ec-\d{18}-(\d{4})(\d{2})\.')
+
 
 def get_account_type(account_number: str) -> str:
     """Get account type description"""
@@ -69,12 +76,9 @@ def validate_account_number(account_number: str) -> bool:
 
 def validate_file_format(filename: str) -> dict:
     """Validate STP file format and extract metadata"""
-    import re
-    
     # Expected pattern: ec-[18-digit-account]-YYYYMM.ext
-    pattern = r'^ec-(\d{18})-(\d{4})(\d{2})\.(pdf|xlsx|xls)$'
-    match = re.match(pattern, filename, re.IGNORECASE)
-    
+    match = _VALID_RE.match(filename)
+
     if not match:
         return {
             'valid': False,
@@ -133,10 +137,8 @@ def format_currency(amount: float, currency: str = 'MXN') -> str:
 
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename for safe file operations"""
-    import re
-    
     # Remove or replace invalid characters
-    filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
+    filename = _SANITIZE_RE.sub('_', filename)
     
     # Remove leading/trailing spaces and dots
     filename = filename.strip(' .')
@@ -174,11 +176,8 @@ def is_pdf_file(filename: str) -> bool:
 
 def extract_year_month_from_filename(filename: str) -> tuple:
     """Extract year and month from STP filename"""
-    import re
-    
-    pattern = r'ec-\d{18}-(\d{4})(\d{2})\.'
-    match = re.search(pattern, filename)
-    
+    match = _YM_RE.search(filename)
+
     if match:
         year = int(match.group(1))
         month = int(match.group(2))
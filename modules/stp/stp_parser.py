@@ -7,99 +7,192 @@ Handles Excel file parsing and date format conversions for STP transactions.
 import logging
 import io
 import openpyxl
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Dict, Any, Optional, Union
 
+# python-calamine decodes the whole sheet in Rust and hands back plain
+# Python values, typically several times faster than openpyxl; the
+# openpyxl read-only path below covers environments without it
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
 logger = logging.getLogger(__name__)
 
+# Header labels expected in STP statements, searched around row 32
+_EXPECTED_HEADERS = [
+    'fecha operación', 'fecha liquidación', 'tipo operación',
+    'concepto', 'clave de rastreo', 'cargos', 'abonos', 'saldos'
+]
+
+
+def _map_columns(row_values) -> Dict[str, int]:
+    """Map expected header names to their column indexes in a header row"""
+    column_mapping = {}
+    for col_idx, cell_value in enumerate(row_values):
+        if cell_value:
+            cell_text = str(cell_value).lower().strip()
+            for expected_header in _EXPECTED_HEADERS:
+                if expected_header in cell_text:
+                    column_mapping[expected_header] = col_idx
+                    break
+    return column_mapping
+
+
+def _build_transaction(row_values, column_mapping: Dict[str, int], filename: str) -> Optional[Dict[str, Any]]:
+    """Build a transaction dict from one data row, or None if it is blank
+
+    Rows may be shorter than the mapped columns when trailing cells are
+    empty, so out-of-range indexes read as None.
+    """
+    width = len(row_values)
+
+    def cell(key):
+        idx = column_mapping[key]
+        return row_values[idx] if idx < width else None
+
+    transaction = {
+        'fecha_operacion': format_date_value(cell('fecha operación')),
+        'fecha_liquidacion': format_date_value(cell('fecha liquidación')),
+        'tipo_operacion': str(cell('tipo operación') or ''),
+        'concepto': str(cell('concepto') or ''),
+        'clave_rastreo': str(cell('clave de rastreo') or ''),
+        'cargos': format_numeric_value(cell('cargos')),
+        'abonos': format_numeric_value(cell('abonos')),
+        'saldos': format_numeric_value(cell('saldos')),
+        'file': filename
+    }
+
+    # Only keep rows where at least one significant field has data
+    if (transaction['fecha_operacion'] or transaction['tipo_operacion'] or
+            transaction['concepto'] or transaction['clave_rastreo'] or
+            transaction['cargos'] or transaction['abonos']):
+        return transaction
+    return None
+
 
 def parse_excel_file(file_content: bytes, filename: str) -> List[Dict[str, Any]]:
     """Extract transactions from Excel file using flexible column mapping"""
+    if CalamineWorkbook is not None:
+        return _parse_excel_calamine(file_content, filename)
+    return _parse_excel_openpyxl(file_content, filename)
+
+
+def _parse_excel_calamine(file_content: bytes, filename: str) -> List[Dict[str, Any]]:
+    """Parse the statement with the Rust-backed calamine reader"""
+    try:
+        workbook = CalamineWorkbook.from_filelike(io.BytesIO(file_content))
+        # skip_empty_area=False keeps absolute row positions - the
+        # header search below depends on the blank preamble rows
+        rows = workbook.get_sheet_by_index(0).to_python(skip_empty_area=False)
+
+        # Find header row containing "Fecha Operación" (typically around row 32)
+        header_row = None
+        column_mapping = {}
+
+        for row_num in range(25, min(50, len(rows) + 1)):
+            row_values = rows[row_num - 1]
+            if any(cell and 'fecha operación' in str(cell).lower() for cell in row_values):
+                header_row = row_num
+                column_mapping = _map_columns(row_values)
+                break
+
+        if not header_row:
+            raise Exception("Header row with 'Fecha Operación' not found")
+
+        # Verify all required columns are present
+        missing_columns = [col for col in _EXPECTED_HEADERS if col not in column_mapping]
+        if missing_columns:
+            raise Exception(f"Missing required columns: {missing_columns}")
+
+        # Extract transaction data
+        transactions = []
+
+        for row_num, row_values in enumerate(rows[header_row:], start=header_row + 1):
+            # Skip empty rows
+            if not any(row_values):
+                continue
+
+            try:
+                transaction = _build_transaction(row_values, column_mapping, filename)
+                if transaction:
+                    transactions.append(transaction)
+            except Exception as e:
+                logger.warning(f"Error processing row {row_num} in {filename}: {e}")
+                continue
+
+        logger.info(f"Extracted {len(transactions)} transactions from {filename}")
+        return transactions
+
+    except Exception as e:
+        logger.error(f"Error parsing Excel file {filename}: {e}")
+        raise
+
+
+def _parse_excel_openpyxl(file_content: bytes, filename: str) -> List[Dict[str, Any]]:
+    """openpyxl fallback used when python-calamine is not installed
+
+    The workbook is opened read-only and streamed with
+    iter_rows(values_only=True): rows arrive as plain value tuples
+    instead of per-cell objects, which is several times faster and
+    keeps memory at one row instead of the whole sheet.
+    """
+    workbook = None
     try:
         # Load Excel file
-        workbook = openpyxl.load_workbook(io.BytesIO(file_content))
+        workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
         worksheet = workbook.active
-        
+
         # Find header row containing "Fecha Operación"
         header_row = None
         column_mapping = {}
-        
+
         # Search for header row (typically around row 32)
-        for row_num in range(25, min(50, worksheet.max_row + 1)):
-            row_values = [cell.value for cell in worksheet[row_num]]
-            
+        for row_num, row_values in enumerate(
+                worksheet.iter_rows(min_row=25, max_row=49, values_only=True), start=25):
             # Check if this row contains our expected headers
             if any(cell and 'fecha operación' in str(cell).lower() for cell in row_values):
                 header_row = row_num
-                
-                # Map column positions by header names
-                expected_headers = [
-                    'fecha operación', 'fecha liquidación', 'tipo operación', 
-                    'concepto', 'clave de rastreo', 'cargos', 'abonos', 'saldos'
-                ]
-                
-                for col_idx, cell_value in enumerate(row_values):
-                    if cell_value:
-                        cell_text = str(cell_value).lower().strip()
-                        for expected_header in expected_headers:
-                            if expected_header in cell_text:
-                                column_mapping[expected_header] = col_idx
-                                break
+                column_mapping = _map_columns(row_values)
                 break
-        
+
         if not header_row:
             raise Exception("Header row with 'Fecha Operación' not found")
-        
+
         # Verify all required columns are present
-        required_columns = [
-            'fecha operación', 'fecha liquidación', 'tipo operación', 
-            'concepto', 'clave de rastreo', 'cargos', 'abonos', 'saldos'
-        ]
-        
-        missing_columns = [col for col in required_columns if col not in column_mapping]
+        missing_columns = [col for col in _EXPECTED_HEADERS if col not in column_mapping]
         if missing_columns:
             raise Exception(f"Missing required columns: {missing_columns}")
-        
+
         # Extract transaction data
         transactions = []
-        
-        for row_num in range(header_row + 1, worksheet.max_row + 1):
-            row_values = [cell.value for cell in worksheet[row_num]]
-            
+
+        for row_num, row_values in enumerate(
+                worksheet.iter_rows(min_row=header_row + 1, values_only=True),
+                start=header_row + 1):
             # Skip empty rows
             if not any(row_values):
                 continue
-            
-            # Extract data using column mapping
+
             try:
-                transaction = {
-                    'fecha_operacion': format_date_value(row_values[column_mapping['fecha operación']]),
-                    'fecha_liquidacion': format_date_value(row_values[column_mapping['fecha liquidación']]),
-                    'tipo_operacion': str(row_values[column_mapping['tipo operación']] or ''),
-                    'concepto': str(row_values[column_mapping['concepto']] or ''),
-                    'clave_rastreo': str(row_values[column_mapping['clave de rastreo']] or ''),
-                    'cargos': format_numeric_value(row_values[column_mapping['cargos']]),
-                    'abonos': format_numeric_value(row_values[column_mapping['abonos']]),
-                    'saldos': format_numeric_value(row_values[column_mapping['saldos']]),
-                    'file': filename
-                }
-                
-                # Only add if at least one significant field has data
-                if (transaction['fecha_operacion'] or transaction['tipo_operacion'] or 
-                    transaction['concepto'] or transaction['clave_rastreo'] or
-                    transaction['cargos'] or transaction['abonos']):
+                transaction = _build_transaction(row_values, column_mapping, filename)
+                if transaction:
                     transactions.append(transaction)
-                    
             except Exception as e:
                 logger.warning(f"Error processing row {row_num} in {filename}: {e}")
                 continue
-        
+
         logger.info(f"Extracted {len(transactions)} transactions from {filename}")
         return transactions
-        
+
     except Exception as e:
         logger.error(f"Error parsing Excel file {filename}: {e}")
         raise
+    finally:
+        # Read-only workbooks keep their source handle open until closed
+        if workbook is not None:
+            workbook.close()
 
 
 def format_date_value(value: Any) -> Optional[str]:
@@ -107,7 +200,8 @@ def format_date_value(value: Any) -> Optional[str]:
     if value is None:
         return None
     
-    if isinstance(value, datetime):
+    # calamine yields datetime.date for date cells, openpyxl datetime
+    if isinstance(value, (datetime, date)):
         return value.strftime('%d/%m/%Y')
     elif isinstance(value, str):
         return value.strip() if value.strip() else None